@@ -0,0 +1,116 @@
+"""Time the verification endpoints with and without database connection reuse.
+
+Runs certificate_details and certificate_info against an existing certificate
+in the database configured by the environment (.env), once per connection
+mode, each in a fresh process:
+
+    none        a new connection for every request (CONN_MAX_AGE=0)
+    persistent  one connection kept open per worker (CONN_MAX_AGE)
+    pool        psycopg connection pool (DB_POOL=True)
+
+    python benchmarks/db_connections.py --certificate 12 --roll 2101001 --requests 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODES = {
+    'none': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'persistent': {'DB_POOL': 'False'},
+    'pool': {'DB_POOL': 'True'},
+}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(certificate, roll, requests):
+    """Run in a child process with the connection mode already in the environment."""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+    from django.db import close_old_connections, connection
+    from django.test import Client
+
+    # Time spent opening (or checking out) a connection
+    connect_times = []
+    connect = connection.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        connect()
+        connect_times.append(time.perf_counter() - start)
+
+    connection.connect = timed_connect
+
+    # The test client keeps connections open across requests; close them the
+    # way a server does at the end of each request
+    client = Client()
+    urls = [
+        f'/certificate/{certificate}/details/{roll}/',
+        f'/certificate/{certificate}/info/',
+    ]
+    for url in urls:
+        response = client.get(url)
+        close_old_connections()
+        if response.status_code != 200:
+            raise SystemExit(f'{url} returned {response.status_code}')
+
+    connect_times.clear()
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        client.get(urls[i % len(urls)])
+        close_old_connections()
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'requests': requests,
+        'connects': len(connect_times),
+        'connect_ms_total': sum(connect_times) * 1000,
+        'connect_ms_mean': statistics.mean(connect_times) * 1000 if connect_times else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--certificate', type=int, required=True)
+    parser.add_argument('--roll', required=True)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.certificate, args.roll, args.requests)))
+        return
+
+    results = {}
+    for mode in args.modes:
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', '--certificate', str(args.certificate),
+             '--roll', args.roll, '--requests', str(args.requests)],
+            env={**os.environ, **MODES[mode]}, capture_output=True, text=True, check=True,
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'mode':<12}{'connects':>10}{'connect ms':>12}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<12}{result['connects']:>10}{result['connect_ms_mean']:>12.2f}"
+              f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['mean_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+"""Replay results-day traffic against a running server.
+
+Simulated users hit the API over HTTP with a weighted mix of requests:
+
+    verify      certificate_details for a roll number (some not in the sheet)
+    check       the lightweight /verify/ yes/no check for a roll number
+    info        certificate_info, the page header
+    preview     generate_certificate, default preview
+    download    generate_certificate/download
+    dashboard   list/<user>/ and templates/<user>/, the organiser's dashboard
+    upload      a small new event through /upload/
+
+A fraction of the users (--baseline) start straight away; the rest join at
+--spike-at seconds, like students arriving the moment results are out.
+Latency percentiles and error rates are reported per scenario. A request
+is an error when the connection fails or the status is not the one the
+scenario expects (404 for roll numbers that are not in the sheet).
+
+Without --certificate a synthetic event of --rows rows is uploaded first
+and deleted again afterwards with everything uploaded during the run.
+
+    python manage.py runserver 8000                  # or: gunicorn config.wsgi -w 4 -b 127.0.0.1:8000
+    python benchmarks/load.py --concurrency 50 --duration 60 --output load.json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from benchmarks.synthetic import roll_number, sheet_csv, template_png, upload_fields  # noqa: E402
+
+USER = 'loadtest'
+DEFAULT_MIX = 'verify=45,check=15,info=10,preview=12,download=5,dashboard=12,upload=1'
+# Roll numbers that are mistyped or belong to another event
+MISS_RATE = 0.1
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # A redirect to stored output is the server's answer; do not time the storage behind it
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+opener = build_opener(NoRedirect)
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def multipart(fields, files):
+    """Encode a multipart/form-data body; ``files`` maps name to (filename, content, content type)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content, content_type) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class LoadTest:
+    def __init__(self, base_url, timeout, upload_rows):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.upload_rows = upload_rows
+        self.certificate = None
+        self.rolls = []
+        self.uploaded = []
+        self.results = []
+        self.lock = threading.Lock()
+
+    def request(self, method, path, body=None, content_type=None):
+        """Send a request and return (status, response body); status is None if it never got one."""
+        request = Request(self.base_url + path, data=body, method=method)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        try:
+            with opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except HTTPError as e:
+            return e.code, e.read()
+        except (URLError, OSError) as e:
+            print(f'{method} {path}: {e}', file=sys.stderr)
+            return None, b''
+
+    def upload(self, rows):
+        body, content_type = multipart(upload_fields(rows, USER), {
+            'csv_file': (f'event-{rows}.csv', sheet_csv(rows), 'text/csv'),
+            'template': ('template.png', template_png(), 'image/png'),
+        })
+        status, content = self.request('POST', '/upload/', body, content_type)
+        if status == 201:
+            with self.lock:
+                self.uploaded.append(json.loads(content)['id'])
+        return status
+
+    # Each scenario sends one request and returns (expected status, status)
+
+    def verify(self):
+        if random.random() < MISS_RATE:
+            return 404, self.request('GET', f'/certificate/{self.certificate}/details/{uuid.uuid4().int % 10 ** 9}/')[0]
+        return 200, self.request('GET', f'/certificate/{self.certificate}/details/{random.choice(self.rolls)}/')[0]
+
+    def check(self):
+        roll_no = uuid.uuid4().int % 10 ** 9 if random.random() < MISS_RATE else random.choice(self.rolls)
+        return 200, self.request('GET', f'/certificate/{self.certificate}/verify/{roll_no}/')[0]
+
+    def info(self):
+        return 200, self.request('GET', f'/certificate/{self.certificate}/info/')[0]
+
+    def preview(self):
+        status = self.request('GET', f'/certificate/{self.certificate}/generate/{random.choice(self.rolls)}/')[0]
+        return (302 if status == 302 else 200), status
+
+    def download(self):
+        status = self.request('GET', f'/certificate/{self.certificate}/generate/{random.choice(self.rolls)}/download/')[0]
+        return (302 if status == 302 else 200), status
+
+    def dashboard(self):
+        path = random.choice([f'/list/{USER}/', f'/templates/{USER}/'])
+        return 200, self.request('GET', path)[0]
+
+    def upload_event(self):
+        return 201, self.upload(self.upload_rows)
+
+    SCENARIOS = {
+        'verify': verify,
+        'check': check,
+        'info': info,
+        'preview': preview,
+        'download': download,
+        'dashboard': dashboard,
+        'upload': upload_event,
+    }
+
+    def user(self, mix, start_at, stop_at, think):
+        names, weights = zip(*mix.items())
+        delay = start_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        while time.monotonic() < stop_at:
+            name = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            expected, status = self.SCENARIOS[name](self)
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.results.append((name, elapsed, status, status == expected))
+            if think:
+                time.sleep(random.expovariate(1 / think))
+
+    def run(self, mix, concurrency, duration, baseline, spike_at, think):
+        start = time.monotonic()
+        stop_at = start + duration
+        initial = max(1, round(concurrency * baseline))
+        threads = [
+            threading.Thread(
+                target=self.user,
+                args=(mix, start if i < initial else start + spike_at, stop_at, think),
+                daemon=True,
+            )
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - start
+
+    def cleanup(self):
+        for pk in self.uploaded:
+            self.request('DELETE', f'/delete/{pk}/{USER}/')
+
+
+def report(results, elapsed):
+    by_scenario = {}
+    for name, seconds, status, ok in results:
+        by_scenario.setdefault(name, []).append((seconds, status, ok))
+
+    summary = []
+    for name, entries in sorted(by_scenario.items()) + [('all', [entry[1:] for entry in results])]:
+        latencies = sorted(seconds for seconds, _, _ in entries)
+        errors = sum(1 for _, _, ok in entries if not ok)
+        statuses = {}
+        for _, status, _ in entries:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary.append({
+            'scenario': name,
+            'requests': len(entries),
+            'errors': errors,
+            'error_rate': round(errors / len(entries), 4),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+            'throughput_rps': round(len(entries) / elapsed, 1),
+            'statuses': statuses,
+        })
+    return summary
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in LoadTest.SCENARIOS:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}')
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=20, help='simulated users at the peak')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--baseline', type=float, default=0.2,
+                        help='fraction of the users active before the spike')
+    parser.add_argument('--spike-at', type=float, default=5, help='seconds before the other users join')
+    parser.add_argument('--think', type=float, default=0, help='mean pause between a user\'s requests, seconds')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'scenario weights (default {DEFAULT_MIX})')
+    parser.add_argument('--certificate', type=int, help='existing certificate to verify against')
+    parser.add_argument('--rolls', help='file with its roll numbers, one per line (with --certificate)')
+    parser.add_argument('--rows', type=int, default=5000, help='rows of the event uploaded without --certificate')
+    parser.add_argument('--upload-rows', type=int, default=200, help='rows of each event the upload scenario sends')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--keep', action='store_true', help='do not delete the events uploaded by the run')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output', help='write the report to this JSON file')
+    args = parser.parse_args()
+
+    if args.certificate and not args.rolls:
+        parser.error('--certificate needs --rolls')
+    random.seed(args.seed)
+    load = LoadTest(args.base_url, args.timeout, args.upload_rows)
+
+    if args.certificate:
+        load.certificate = args.certificate
+        load.rolls = [line.strip() for line in Path(args.rolls).read_text().splitlines() if line.strip()]
+    else:
+        status = load.upload(args.rows)
+        if status != 201:
+            raise SystemExit(f'Uploading the {args.rows}-row event failed: HTTP {status}')
+        load.certificate = load.uploaded[0]
+        load.rolls = [roll_number(i) for i in range(args.rows)]
+
+    print(f'{args.concurrency} users ({round(args.concurrency * args.baseline) or 1} until {args.spike_at:g}s) '
+          f'for {args.duration:g}s against {args.base_url}, certificate {load.certificate}', file=sys.stderr)
+    try:
+        elapsed = load.run(args.mix, args.concurrency, args.duration, args.baseline, args.spike_at, args.think)
+    finally:
+        if not args.keep:
+            load.cleanup()
+
+    if not load.results:
+        raise SystemExit('No requests completed')
+    summary = report(load.results, elapsed)
+    print(f"{'scenario':<12}{'requests':>9}{'errors':>8}{'err %':>7}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'req/s':>8}", file=sys.stderr)
+    for entry in summary:
+        print(f"{entry['scenario']:<12}{entry['requests']:>9}{entry['errors']:>8}{entry['error_rate'] * 100:>7.1f}"
+              f"{entry['p50_ms']:>10.1f}{entry['p95_ms']:>10.1f}{entry['p99_ms']:>10.1f}"
+              f"{entry['throughput_rps']:>8.1f}", file=sys.stderr)
+
+    output = json.dumps({
+        'meta': {
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'baseline': args.baseline,
+            'spike_at': args.spike_at,
+            'mix': args.mix,
+            'certificate': load.certificate,
+        },
+        'results': summary,
+    }, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
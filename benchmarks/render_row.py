@@ -0,0 +1,114 @@
+"""Per-row cost of drawing certificate text: per-field drawing vs. text tiles.
+
+``direct`` is how generate_certificate drew before layout plans and base
+layers: a copy of the template as uploaded, then ImageDraw.text for every
+field. ``tiles`` is the current renderer (render.draw_row): each field's
+text composited from a cached RGBA tile onto a reused copy of the
+normalized base layer, which is patched back afterwards; palette templates
+are still encoded as palette PNGs. Both run on a synthetic A4 template at
+300 dpi, in palette and RGB mode, with and without encoding to PNG.
+
+    python benchmarks/render_row.py --rows 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('MEDIA_STORAGE_BACKEND', 'memory')
+
+import django  # noqa: E402
+
+django.setup()
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from config.fonts import load_font  # noqa: E402
+from config.layout import LayoutPlan, draw_text, tile_cache  # noqa: E402
+from config.render import _canvas, draw_row, encode_image, normalize_mode  # noqa: E402
+
+FIELDS = [
+    SimpleNamespace(field_name='Name', csv_column='name', x=1240, y=700, font_size=96, font_color='#1a237e',
+                    font_family='DejaVuSans', align='center', max_width=1800),
+    SimpleNamespace(field_name='Roll', csv_column='roll', x=400, y=900, font_size=48, font_color='black',
+                    font_family='DejaVuSans', align='left', max_width=None),
+    SimpleNamespace(field_name='Grade', csv_column='grade', x=1240, y=1050, font_size=64, font_color='black',
+                    font_family='DejaVuSans', align='center', max_width=None),
+    SimpleNamespace(field_name='Date', csv_column='date', x=2080, y=1500, font_size=40, font_color='black',
+                    font_family='DejaVuSans', align='right', max_width=None),
+]
+
+
+def template(mode):
+    img = Image.new('RGB', (2480, 1754), 'white')
+    draw = ImageDraw.Draw(img)
+    for i in range(0, 2480, 40):
+        draw.line([(i, 0), (2480 - i, 1754)], fill=(200, 180 + i % 60, 120), width=3)
+    draw.rectangle([60, 60, 2420, 1694], outline=(120, 90, 20), width=20)
+    return img.quantize(256) if mode == 'P' else img
+
+
+def sheet(count):
+    names = ['Aarav', 'Diya', 'Ishaan', 'Meera', 'Rohan', 'Saanvi', 'Vihaan', 'Zara']
+    return [{
+        'name': f'{random.choice(names)} {random.choice(names)}son {i}',
+        'roll': str(210000000 + i),
+        'grade': random.choice(['AA', 'AB', 'BB', 'BC']),
+        'date': '18 October 2026',
+    } for i in range(count)]
+
+
+def direct(template, rows, encode):
+    for row in rows:
+        img = template.copy()
+        draw = ImageDraw.Draw(img)
+        for field in FIELDS:
+            draw.text((field.x, field.y), str(row.get(field.csv_column, '')),
+                      font=load_font(field.font_family, field.font_size), fill=field.font_color)
+        if encode:
+            encode_image(img, 'png')
+
+
+def tiles(template, rows, encode):
+    base = normalize_mode(template)
+    for _, placements in LayoutPlan(FIELDS).iter_placements(rows):
+        if encode:
+            draw_row(base, placements)
+            continue
+        # draw_row without the encoding step
+        img = _canvas(base)
+        for box in draw_text(img, placements):
+            img.paste(base.crop(box), box[:2])
+
+
+def per_row_ms(func, template, rows, encode):
+    tile_cache.clear()
+    start = time.perf_counter()
+    func(template, rows, encode)
+    return (time.perf_counter() - start) * 1000 / len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    rows = sheet(args.rows)
+    print(f"{'template':<10}{'encode':<8}{'direct ms/row':>15}{'tiles ms/row':>15}{'speedup':>10}")
+    for mode in ('P', 'RGB'):
+        img = template(mode)
+        for encode in (False, True):
+            before = per_row_ms(direct, img, rows, encode)
+            after = per_row_ms(tiles, img, rows, encode)
+            print(f"{mode:<10}{'png' if encode else 'no':<8}{before:>15.2f}{after:>15.2f}{before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
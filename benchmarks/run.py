@@ -0,0 +1,230 @@
+"""Benchmark the certificate hot paths against synthetic events.
+
+For each sheet size a synthetic template and CSV are uploaded through
+``/upload/``, then certificate_details, verify_roll, generate_certificate (preview and
+download) and user_templates are called for random roll numbers through
+Django's test client. Each benchmark reports latency percentiles,
+throughput, peak Python memory of one request and queries per request.
+
+Runs on benchmarks/settings.py: SQLite (or BENCH_DATABASE_URL) and
+in-memory storage, nothing else to start.
+
+    python benchmarks/run.py --rows 100 1000 10000 --output results.json
+    python benchmarks/run.py --compare results.json   # exit 1 on regressions
+
+Results are JSON; ``--compare`` checks a run against earlier results and
+fails when a benchmark got slower than ``--tolerance`` allows or makes
+more queries than before.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from benchmarks.synthetic import roll_number, sheet_csv, template_png, upload_fields  # noqa: E402
+
+USER = 'benchmark'
+
+
+def upload(client, rows):
+    return client.post('/upload/', {
+        'csv_file': SimpleUploadedFile(f'event-{rows}.csv', sheet_csv(rows), 'text/csv'),
+        'template': SimpleUploadedFile('template.png', template_png(), 'image/png'),
+        **upload_fields(rows, USER),
+    })
+
+
+def measure(name, rows, requests):
+    """Time ``requests`` (callables returning a response) and trace the memory of the first."""
+    client_calls = list(requests)
+
+    tracemalloc.start()
+    check(name, client_calls[0]())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies = []
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for call in client_calls[1:]:
+            request_start = time.perf_counter()
+            check(name, call())
+            latencies.append(time.perf_counter() - request_start)
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'benchmark': name,
+        'rows': rows,
+        'requests': len(latencies),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'queries_per_request': round(len(queries) / len(latencies), 2),
+    }
+
+
+def check(name, response):
+    if response.status_code >= 400:
+        raise SystemExit(f'{name}: HTTP {response.status_code}')
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def run_size(client, rows, iterations, uploads):
+    results = []
+
+    # The first upload is traced for memory only; tracing slows it down too
+    # much to time. The last upload is the one the read paths use
+    tracemalloc.start()
+    check('upload_certificate', upload(client, rows))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(uploads):
+            start = time.perf_counter()
+            response = check('upload_certificate', upload(client, rows))
+            times.append(time.perf_counter() - start)
+    pk = response.json()['id']
+    results.append({
+        'benchmark': 'upload_certificate',
+        'rows': rows,
+        'requests': uploads,
+        'p50_ms': round(statistics.median(times) * 1000, 3),
+        'p95_ms': round(max(times) * 1000, 3),
+        'mean_ms': round(statistics.mean(times) * 1000, 3),
+        'throughput_rps': round(uploads / sum(times), 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'queries_per_request': round(len(queries) / uploads, 2),
+    })
+
+    # A fresh random roll number per request, so the lookup and render caches
+    # are as cold as on results day
+    def rolls():
+        return [roll_number(i) for i in random.sample(range(rows), min(rows, iterations + 1))]
+
+    results.append(measure('certificate_details', rows, [
+        lambda roll=roll: client.get(f'/certificate/{pk}/details/{roll}/') for roll in rolls()
+    ]))
+    results.append(measure('verify_roll', rows, [
+        lambda roll=roll: client.get(f'/certificate/{pk}/verify/{roll}/') for roll in rolls()
+    ]))
+    results.append(measure('generate_certificate_preview', rows, [
+        lambda roll=roll: client.get(f'/certificate/{pk}/generate/{roll}/') for roll in rolls()
+    ]))
+    results.append(measure('generate_certificate_download', rows, [
+        lambda roll=roll: client.get(f'/certificate/{pk}/generate/{roll}/download/') for roll in rolls()
+    ]))
+    results.append(measure('user_templates', rows, [
+        lambda: client.get(f'/templates/{USER}/') for _ in range(iterations + 1)
+    ]))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the regressions of ``results`` against ``baseline``."""
+    previous = {(entry['benchmark'], entry['rows']): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        before = previous.get((entry['benchmark'], entry['rows']))
+        if before is None:
+            continue
+        if entry['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{entry['benchmark']} ({entry['rows']} rows): p50 "
+                               f"{before['p50_ms']:.1f} -> {entry['p50_ms']:.1f} ms")
+        if entry['queries_per_request'] > before['queries_per_request']:
+            regressions.append(f"{entry['benchmark']} ({entry['rows']} rows): queries per request "
+                               f"{before['queries_per_request']} -> {entry['queries_per_request']}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='sheet sizes to benchmark (up to 100000)')
+    parser.add_argument('--iterations', type=int, default=50, help='requests per read benchmark')
+    parser.add_argument('--uploads', type=int, default=2, help='timed uploads per sheet size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='earlier results to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed p50 slowdown against --compare (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    client = Client()
+
+    results = []
+    for rows in args.rows:
+        for entry in run_size(client, rows, args.iterations, args.uploads):
+            results.append(entry)
+            print(f"{entry['benchmark']:<32}{entry['rows']:>8} rows  p50 {entry['p50_ms']:>9.2f} ms  "
+                  f"p95 {entry['p95_ms']:>9.2f} ms  {entry['throughput_rps']:>8.1f}/s  "
+                  f"{entry['peak_memory_kb']:>9.0f} KB  {entry['queries_per_request']:>5} queries",
+                  file=sys.stderr)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': args.iterations,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
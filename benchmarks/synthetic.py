@@ -0,0 +1,57 @@
+"""Synthetic events for the benchmarks: a template image, a sheet and its fields."""
+import csv
+import io
+import json
+import random
+
+from PIL import Image, ImageDraw
+
+FIRST_NAMES = ['Aarav', 'Diya', 'Ishaan', 'Meera', 'Rohan', 'Saanvi', 'Vihaan', 'Zara', 'Kabir', 'Anaya']
+LAST_NAMES = ['Sharma', 'Iyer', 'Patel', 'Reddy', 'Gupta', 'Nair', 'Das', 'Joshi']
+FIRST_ROLL = 210000000
+VARIABLES = [
+    {'field_name': 'Name', 'csv_column': 'name', 'x': 800, 'y': 520, 'font_size': 56, 'font_color': '#1a237e',
+     'font_family': 'DejaVuSans', 'align': 'center', 'max_width': 1000},
+    {'field_name': 'Roll', 'csv_column': 'roll_no', 'x': 300, 'y': 660, 'font_size': 32, 'font_color': 'black',
+     'font_family': 'DejaVuSans'},
+    {'field_name': 'Grade', 'csv_column': 'grade', 'x': 1300, 'y': 660, 'font_size': 32, 'font_color': 'black',
+     'font_family': 'DejaVuSans', 'align': 'right'},
+]
+
+
+def roll_number(i):
+    """Roll number of row ``i`` of a synthetic sheet."""
+    return str(FIRST_ROLL + i)
+
+
+def template_png(width=1600, height=1131):
+    img = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(img)
+    for i in range(0, width, 32):
+        draw.line([(i, 0), (width - i, height)], fill=(220, 200 + i % 40, 150), width=2)
+    draw.rectangle([40, 40, width - 40, height - 40], outline=(120, 90, 20), width=12)
+    output = io.BytesIO()
+    img.save(output, 'PNG')
+    return output.getvalue()
+
+
+def sheet_csv(rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['roll_no', 'name', 'grade', 'email'])
+    for i in range(rows):
+        roll = roll_number(i)
+        writer.writerow([roll, f'{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}',
+                         random.choice(['AA', 'AB', 'BB', 'BC', 'CC']), f'{roll}@example.edu'])
+    return output.getvalue().encode()
+
+
+def upload_fields(rows, user):
+    """The form fields of an /upload/ request for a synthetic event of ``rows`` rows."""
+    return {
+        'title': f'Benchmark event ({rows} rows)',
+        'organization': 'ITC',
+        'roll_column': 'roll_no',
+        'user': user,
+        'variables': json.dumps(VARIABLES),
+    }
@@ -16,6 +16,9 @@ find . -type f -name "*.sqlite3" -delete
 # Remove static and media files (if not using persistent storage)
 rm -rf staticfiles/
 rm -rf media/
+rm -rf render_cache/
+rm -rf snapshot_cache/
+rm -rf django_cache/
 
 # Remove any .DS_Store files on macOS
 find . -type f -name ".DS_Store" -delete
@@ -1,12 +1,13 @@
 from django.contrib import admin
-from .models import Certificate, CertificateField
+from .models import Certificate, CertificateField, CertificateRow, RenderJob
 
 @admin.register(Certificate)
 class CertificateAdmin(admin.ModelAdmin):
     list_display = ('title', 'organization', 'verified', 'created_at', 'user')
     list_filter = ('verified', 'created_at', 'organization')
     search_fields = ('title', 'user', 'organization')
-    readonly_fields = ('created_at',)
+    # Derived from csv_data; replacing the sheet resets them
+    readonly_fields = ('created_at', 'row_count', 'csv_snapshot')
     list_editable = ('verified',)
 
 @admin.register(CertificateField)
@@ -14,3 +15,15 @@ class CertificateFieldAdmin(admin.ModelAdmin):
     list_display = ('certificate', 'field_name', 'csv_column', 'x', 'y')
     list_filter = ('certificate', 'field_name')
     search_fields = ('field_name', 'csv_column')
+
+@admin.register(CertificateRow)
+class CertificateRowAdmin(admin.ModelAdmin):
+    list_display = ('certificate', 'roll_no')
+    list_filter = ('certificate',)
+    search_fields = ('roll_no',)
+
+@admin.register(RenderJob)
+class RenderJobAdmin(admin.ModelAdmin):
+    list_display = ('certificate', 'kind', 'status', 'done', 'total', 'created_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
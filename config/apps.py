@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CertificateConfig(AppConfig):
+    name = 'config'
+
+    def ready(self):
+        from . import signals  # noqa: F401
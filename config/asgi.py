@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Serve the storage-bound endpoints with their async versions
+os.environ.setdefault('ROOT_URLCONF', 'config.async_urls')
 
 application = get_asgi_application()
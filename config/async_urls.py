@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# Used by the ASGI app (see asgi.py): the async views take precedence and
+# every other route falls through to the regular sync views
+urlpatterns = [
+    path('certificate/<int:pk>/preview/', async_views.certificate_preview),
+    path('certificate/<int:pk>/details/<str:roll_no>/', async_views.certificate_details),
+    path('certificate/<int:pk>/verify/<str:roll_no>/', async_views.verify_roll),
+    path('certificate/<int:pk>/info/', async_views.certificate_info),
+    path('certificate/<int:pk>/generate-all/', async_views.generate_all_certificates),
+    path('certificate/<int:pk>/generate/<str:roll_no>/', async_views.generate_certificate),
+    path('certificate/<int:pk>/generate/<str:roll_no>/<str:mode>/', async_views.generate_certificate),
+    path('certificate/<int:pk>/csv/<str:user>/', async_views.download_csv),
+    path('jobs/<int:job_id>/result/', async_views.render_job_result),
+] + sync_urlpatterns
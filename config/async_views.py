@@ -0,0 +1,223 @@
+"""Async versions of the read-heavy endpoints, served by the ASGI app.
+
+Database access uses Django's async ORM, storage and disk I/O run in worker
+threads, and rendering runs on a bounded executor, so one ASGI worker can
+keep hundreds of verifications in flight while MinIO or the renderer is
+busy. Long downloads (every certificate as a ZIP, job results) are sent as
+they are produced rather than buffered. Responses match the sync views in
+views.py.
+"""
+import asyncio
+import contextvars
+import functools
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.text import get_valid_filename
+from django.views.decorators.http import require_GET
+
+from .datasets import load_dataset
+from .lookups import details_data, get_certificate, get_fields, info_data, verify_data
+from .models import Certificate, CertificateField, RenderJob
+from .outputs import is_stored_output, open_output, output_format, output_key, output_url, render_options, save_output
+from .render import claim_render_slot, release_render_slot, render_output, render_rows
+from .rows import get_row, iter_rows, row_columns
+from .serializers import field_data
+from .storage import open_stream
+from .streaming import AsyncClosingStream, file_response, iterate_in_thread, stream_zip
+
+# Rendering is CPU-bound; cap how many renders one worker runs at a time
+render_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_RENDER_WORKERS,
+    thread_name_prefix='certificate-render',
+)
+
+
+def in_thread(func):
+    # Storage and disk calls block, run them off the event loop
+    return sync_to_async(func, thread_sensitive=False)
+
+
+@require_GET
+async def certificate_details(request, pk, roll_no):
+    try:
+        # Served from the shared cache once any worker has looked it up
+        data = await sync_to_async(details_data)(pk, roll_no)
+
+        if data is None:
+            return JsonResponse({"error": "Roll number not found"}, status=404)
+
+        return JsonResponse(data)
+    except Certificate.DoesNotExist:
+        return JsonResponse({"error": "Certificate not found"}, status=404)
+    except Exception as e:
+        print("Error in certificate_details:", str(e))
+        return JsonResponse({"error": "Failed to fetch certificate details"}, status=500)
+
+
+@require_GET
+async def verify_roll(request, pk, roll_no):
+    try:
+        return JsonResponse(await sync_to_async(verify_data)(pk, roll_no))
+    except Certificate.DoesNotExist:
+        return JsonResponse({"error": "Certificate not found"}, status=404)
+    except Exception as e:
+        print("Error in verify_roll:", str(e))
+        return JsonResponse({"error": "Failed to verify roll number"}, status=500)
+
+
+@require_GET
+async def certificate_info(request, pk):
+    try:
+        return JsonResponse(await sync_to_async(info_data)(pk))
+    except Certificate.DoesNotExist:
+        return JsonResponse({"error": "Certificate not found"}, status=404)
+
+
+@require_GET
+async def certificate_preview(request, pk):
+    try:
+        certificate = await sync_to_async(get_certificate)(pk)
+        fields = await sync_to_async(get_fields)(pk)
+
+        # Read first row of CSV, only the columns the fields use (plus the
+        # roll column, so a certificate without fields still has its rows)
+        df = await in_thread(load_dataset)(certificate, row_columns(certificate, fields))
+        first_row = df.iloc[0].to_dict()
+
+        return JsonResponse({
+            'template': await in_thread(lambda: certificate.template.url)(),
+            'fields': field_data(fields, first_row)
+        })
+    except Exception as e:
+        print("Error in certificate_preview:", str(e))
+        return JsonResponse({"error": "Failed to fetch preview"}, status=500)
+
+
+@require_GET
+async def generate_certificate(request, pk, roll_no, mode='preview'):
+    try:
+        options = render_options(mode, request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    try:
+        certificate = await sync_to_async(get_certificate)(pk)
+        fields = await sync_to_async(get_fields)(pk)
+
+        # Look up the row with matching roll number in the index
+        row = await sync_to_async(get_row)(certificate, roll_no)
+
+        if row is None:
+            return JsonResponse({"error": "Roll number not found"}, status=404)
+
+        # Serve a previously rendered copy when nothing about it has changed
+        key = output_key(certificate, fields, row, options)
+        etag = quote_etag(key)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        extension, content_type = output_format(options)
+        stored = is_stored_output(options)
+        # Send the client straight to a stored copy (pre-rendered, for example) when enabled
+        if settings.DOWNLOAD_REDIRECT and stored:
+            url = await in_thread(output_url)(certificate.id, key, extension)
+            if url is not None:
+                return HttpResponseRedirect(url)
+
+        output = await in_thread(open_output)(certificate.id, key, extension) if stored else None
+        if output is None:
+            loop = asyncio.get_running_loop()
+            # Run in a copy of this context so render stages reach the request's timings
+            render = functools.partial(contextvars.copy_context().run, render_output, certificate, fields, row, options)
+            content = await loop.run_in_executor(render_executor, render)
+            if stored:
+                await in_thread(save_output)(certificate.id, key, extension, content)
+            output = io.BytesIO(content), len(content)
+
+        output_file, size = output
+        response = file_response(request, output_file, size, content_type,
+                                 f'certificate_{pk}_{roll_no}.{extension}', asynchronous=True)
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+    except Certificate.DoesNotExist:
+        return JsonResponse({"error": "Certificate not found"}, status=404)
+    except Exception as e:
+        print(f"Certificate generation error: {str(e)}")
+        return JsonResponse({"error": "Failed to generate certificate"}, status=500)
+
+
+@require_GET
+async def generate_all_certificates(request, pk):
+    try:
+        certificate = await Certificate.objects.aget(id=pk)
+        fields = [field async for field in CertificateField.objects.filter(certificate=certificate)]
+    except Certificate.DoesNotExist:
+        return JsonResponse({"error": "Certificate not found"}, status=404)
+
+    # Each archive keeps a render pool busy for as long as it streams
+    slot = await in_thread(claim_render_slot)()
+    if slot is None:
+        response = JsonResponse(
+            {"error": "Too many archives are being generated, try again shortly or queue a zip job"}, status=503
+        )
+        response['Retry-After'] = '30'
+        return response
+
+    def entries():
+        rows = iter_rows(certificate, row_columns(certificate, fields))
+        for row, content in render_rows(certificate, fields, rows):
+            roll_no = get_valid_filename(row.get(certificate.roll_column) or 'unknown')
+            yield f'certificate_{pk}_{roll_no}.png', content
+
+    # Rendered in the request's sync thread and sent one certificate at a
+    # time; the slot is given back when the response is closed
+    archive = AsyncClosingStream(iterate_in_thread(stream_zip(entries())), lambda: release_render_slot(slot))
+    response = StreamingHttpResponse(archive, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{get_valid_filename(certificate.title)}-certificates.zip"'
+    return response
+
+
+@require_GET
+async def render_job_result(request, job_id):
+    try:
+        job = await RenderJob.objects.aget(id=job_id)
+    except RenderJob.DoesNotExist:
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+    if job.status != 'done' or not job.result:
+        return JsonResponse({"error": "Job has no result yet", "status": job.status}, status=409)
+
+    if settings.DOWNLOAD_REDIRECT:
+        return HttpResponseRedirect(await in_thread(lambda: job.result.url)())
+    result = await in_thread(open_stream)(job.result.storage, job.result.name)
+    size = await in_thread(lambda: job.result.size)()
+    return file_response(request, result, size, 'application/octet-stream',
+                         job.result.name.rsplit('/', 1)[-1], as_attachment=True, asynchronous=True)
+
+
+@require_GET
+async def download_csv(request, pk, user):
+    try:
+        certificate = await Certificate.objects.aget(id=pk, user=user)
+
+        # Let the client fetch the object from storage itself when enabled
+        if settings.DOWNLOAD_REDIRECT:
+            return HttpResponseRedirect(await in_thread(lambda: certificate.csv_data.url)())
+
+        csv_file = await in_thread(open_stream)(certificate.csv_data.storage, certificate.csv_data.name)
+        size = await in_thread(lambda: certificate.csv_data.size)()
+        filename = f'{certificate.title.lower().replace(" ", "-")}-data.csv'
+        return file_response(request, csv_file, size, 'text/csv', filename, as_attachment=True, asynchronous=True)
+    except Certificate.DoesNotExist:
+        return JsonResponse({"error": "Certificate not found"}, status=404)
+    except Exception as e:
+        print("Error downloading CSV:", str(e))
+        return JsonResponse({"error": "Failed to download CSV"}, status=500)
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .lru import MemoryLRU
+from .metrics import stage
+from .snapshots import load_columns
+
+# Parsed sheets keyed by certificate id and tagged with the object they came
+# from (and the columns loaded, when only some were)
+dataset_cache = MemoryLRU(settings.DATASET_CACHE_MAX_BYTES)
+
+
+def read_csv_as_text(csv_file):
+    # Read every column as text so roll numbers and values keep the exact
+    # spelling from the sheet (no 123 -> 123.0 or NaN -> 'nan' surprises)
+    return pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+
+
+def load_dataset(certificate, columns=None):
+    """Return the parsed CSV of a certificate, reading it from storage only on a cache miss.
+
+    With ``columns`` only those columns are loaded, from the columnar
+    snapshot when the certificate has one. The DataFrame is shared between
+    requests and must not be modified.
+    """
+    if columns is not None and certificate.csv_snapshot:
+        columns = tuple(dict.fromkeys(columns))
+        source = (certificate.csv_snapshot.name, columns)
+    else:
+        source = certificate.csv_data.name
+    df = dataset_cache.get(certificate.id, tag=source)
+    if df is None:
+        if isinstance(source, tuple):
+            with stage('storage'):
+                arrays = load_columns(certificate, columns)
+            with stage('csv'):
+                df = pd.DataFrame({column: np.char.decode(array, 'utf-8') for column, array in arrays.items()}, dtype=object)
+        else:
+            with stage('storage'):
+                csv_file = certificate.csv_data.open('rb')
+            with csv_file, stage('csv'):
+                df = read_csv_as_text(csv_file)
+        dataset_cache.put(certificate.id, df, int(df.memory_usage(index=True, deep=True).sum()), tag=source)
+    return df
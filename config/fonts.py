@@ -0,0 +1,34 @@
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from PIL import ImageFont
+
+from .metrics import stage
+
+DEFAULT_FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+
+def resolve_font_path(family):
+    # Look for "<family>.ttf" in the configured font directories and
+    # fall back to DejaVu Sans like the renderer always has
+    for directory in settings.CERTIFICATE_FONT_DIRS:
+        path = os.path.join(directory, f'{family}.ttf')
+        if family and os.path.isfile(path):
+            return path
+    return DEFAULT_FONT
+
+
+@lru_cache(maxsize=settings.FONT_CACHE_SIZE)
+def load_font(family, size):
+    with stage('font'):
+        return _open_font(family, size)
+
+
+def _open_font(family, size):
+    try:
+        # Try to use TrueType font with specified size
+        return ImageFont.truetype(resolve_font_path(family), size=size)
+    except OSError:
+        # Fall back to Pillow's bundled font, which can also be scaled
+        return ImageFont.load_default(size=size)
@@ -0,0 +1,102 @@
+import codecs
+import csv
+import tempfile
+
+import chardet
+from django.conf import settings
+
+from .models import CertificateRow
+from .rows import INDEX_BATCH_SIZE, normalize_roll
+from .streaming import decoded_lines
+
+# Bytes looked at to guess the encoding of a sheet that is not UTF-8
+ENCODING_SAMPLE_SIZE = 64 * 1024
+# How many offending roll numbers to list in an error message
+MAX_REPORTED = 10
+
+
+class CSVValidationError(Exception):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def detect_encoding(sample):
+    try:
+        sample.decode('utf-8')
+        return 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the sample is still UTF-8
+        if e.reason == 'unexpected end of data':
+            return 'utf-8-sig'
+    return chardet.detect(sample)['encoding'] or 'latin-1'
+
+
+def ingest_csv(certificate, csv_file, columns):
+    """Validate an uploaded sheet and index it in a single streaming pass.
+
+    Checks that the roll column and every column in ``columns`` exist and
+    that roll numbers are present and unique, stores each row as a
+    CertificateRow in batches, and returns the sheet re-encoded as UTF-8 in
+    a temporary file. Nothing is held in memory beyond one batch of rows and
+    the set of roll numbers seen so far.
+
+    Raises CSVValidationError listing every problem found. Call inside a
+    transaction so rows already written are rolled back on failure.
+    """
+    csv_file.seek(0)
+    encoding = detect_encoding(csv_file.read(ENCODING_SAMPLE_SIZE))
+    csv_file.seek(0)
+
+    reader = csv.reader(decoded_lines(csv_file, encoding))
+    header = next(reader, None)
+    if not header:
+        raise CSVValidationError(['CSV file is empty'])
+
+    missing = [column for column in [certificate.roll_column, *columns] if column not in header]
+    if missing:
+        raise CSVValidationError([f"Column '{column}' not found in CSV" for column in dict.fromkeys(missing)])
+    roll_index = header.index(certificate.roll_column)
+
+    normalized = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    writer = csv.writer(codecs.getwriter('utf-8')(normalized))
+    writer.writerow(header)
+
+    seen = set()
+    duplicates = []
+    blank_lines = []
+    batch = []
+    count = 0
+    for line_number, values in enumerate(reader, start=2):
+        if not any(values):
+            continue
+        values = values + [''] * (len(header) - len(values))
+        writer.writerow(values)
+
+        roll_no = normalize_roll(values[roll_index])
+        if not roll_no:
+            blank_lines.append(line_number)
+            continue
+        if roll_no in seen:
+            duplicates.append(roll_no)
+            continue
+        seen.add(roll_no)
+
+        batch.append(CertificateRow(certificate=certificate, roll_no=roll_no, data=dict(zip(header, values))))
+        count += 1
+        if len(batch) >= INDEX_BATCH_SIZE:
+            CertificateRow.objects.bulk_create(batch)
+            batch = []
+    CertificateRow.objects.bulk_create(batch)
+
+    errors = []
+    if blank_lines:
+        errors.append(f"Missing roll number on line(s) {', '.join(map(str, blank_lines[:MAX_REPORTED]))}")
+    if duplicates:
+        errors.append(f"Duplicate roll number(s): {', '.join(list(dict.fromkeys(duplicates))[:MAX_REPORTED])}")
+    if errors:
+        normalized.close()
+        raise CSVValidationError(errors)
+
+    normalized.seek(0)
+    return normalized, count
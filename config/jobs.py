@@ -0,0 +1,188 @@
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .layout import LayoutPlan
+from .models import CertificateField, RenderJob
+from .outputs import DOWNLOAD, render_options
+from .pdf import write_pdf
+from .render import load_template, render_rows
+from .rows import build_row_index, iter_rows, row_columns
+from .streaming import stream_zip
+
+# Write progress to the database at most this often
+PROGRESS_INTERVAL = 1.0
+
+
+def submit_job(certificate, kind='zip'):
+    return RenderJob.objects.create(certificate=certificate, kind=kind)
+
+
+def claim_next_job():
+    """Mark the oldest queued job as running and return it, or None if the queue is empty.
+
+    Rows locked by another worker are skipped, so several workers can share
+    one queue table. Running jobs whose worker stopped reporting progress
+    are recovered first, see recover_stale_jobs.
+    """
+    recover_stale_jobs()
+    with transaction.atomic():
+        job = (
+            RenderJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='queued')
+            .order_by('created_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'attempts'])
+    return job
+
+
+def recover_stale_jobs():
+    """Queue again, or fail, running jobs that have not reported progress for RENDER_JOB_STALE_AFTER seconds.
+
+    A job left running by a worker that was killed or restarted would
+    otherwise report running forever, and keep schedule_prerender from
+    queueing another prerender of its certificate.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.RENDER_JOB_STALE_AFTER)
+    stale = (
+        RenderJob.objects
+        .filter(status='running')
+        .filter(Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at=None, started_at__lt=cutoff))
+    )
+    stale.filter(attempts__lt=settings.RENDER_JOB_MAX_ATTEMPTS).update(
+        status='queued', done=0, started_at=None, heartbeat_at=None,
+    )
+    stale.update(status='failed', error='Render worker stopped responding', finished_at=now)
+
+
+def run_job(job):
+    certificate = job.certificate
+    try:
+        fields = list(CertificateField.objects.filter(certificate=certificate))
+        if certificate.row_count is None:
+            build_row_index(certificate)
+        job.total = certificate.row_count
+        rows = iter_rows(certificate, row_columns(certificate, fields))
+        RenderJob.objects.filter(id=job.id).update(total=job.total)
+
+        if job.kind == 'pdf':
+            rows = _track_progress(job, rows)
+            _write_pdf(job, certificate, fields, rows)
+        elif job.kind == 'zip':
+            rendered = _track_progress(job, render_rows(certificate, fields, rows))
+            _write_zip(job, certificate, rendered)
+        else:
+            _prerender(job, certificate, fields)
+
+        job.status = 'done'
+    except Exception as e:
+        print(f"Render job {job.id} failed: {str(e)}")
+        job.status = 'failed'
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+def prerender_options():
+    """What students ask for first: the default preview and the full-size download."""
+    return [render_options('preview', {}), DOWNLOAD]
+
+
+def schedule_prerender(certificate):
+    """Queue a prerender job for ``certificate`` once the current transaction commits.
+
+    Does nothing unless PRERENDER_CERTIFICATES is on or while a prerender
+    of the certificate is already waiting or running.
+    """
+    if not settings.PRERENDER_CERTIFICATES:
+        return
+
+    def submit():
+        pending = RenderJob.objects.filter(certificate=certificate, kind='prerender', status__in=['queued', 'running'])
+        if not pending.exists():
+            submit_job(certificate, 'prerender')
+
+    transaction.on_commit(submit)
+
+
+def _prerender(job, certificate, fields):
+    # Every row once per output, filling the output cache generate_certificate serves from
+    options = prerender_options()
+    job.total *= len(options)
+    RenderJob.objects.filter(id=job.id).update(total=job.total)
+    rendered = (
+        item
+        for option in options
+        for item in render_rows(certificate, fields, iter_rows(certificate, row_columns(certificate, fields)),
+                                option, workers=settings.PRERENDER_WORKERS)
+    )
+    for _ in _track_progress(job, _throttle(rendered, settings.PRERENDER_RATE)):
+        pass
+
+
+def _throttle(items, rate):
+    """Yield ``items`` at no more than ``rate`` per second; 0 means no limit."""
+    if not rate:
+        yield from items
+        return
+    start = time.monotonic()
+    for count, item in enumerate(items, 1):
+        yield item
+        delay = start + count / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _track_progress(job, rendered):
+    done = 0
+    last_update = time.monotonic()
+    for item in rendered:
+        done += 1
+        if time.monotonic() - last_update >= PROGRESS_INTERVAL:
+            RenderJob.objects.filter(id=job.id).update(done=done, heartbeat_at=timezone.now())
+            last_update = time.monotonic()
+        yield item
+    RenderJob.objects.filter(id=job.id).update(done=done, heartbeat_at=timezone.now())
+    job.done = done
+
+
+def _write_zip(job, certificate, rendered):
+    def entries():
+        for row, content in rendered:
+            roll_no = get_valid_filename(row.get(certificate.roll_column) or 'unknown')
+            yield f'certificate_{certificate.id}_{roll_no}.png', content
+
+    with tempfile.TemporaryFile() as archive:
+        for chunk in stream_zip(entries()):
+            archive.write(chunk)
+        _save_result(job, certificate, archive, 'zip')
+
+
+def _write_pdf(job, certificate, fields, rows):
+    # Every page shares a single embedded copy of the template
+    with tempfile.TemporaryFile() as document:
+        write_pdf(document, load_template(certificate), LayoutPlan(fields), rows)
+        _save_result(job, certificate, document, 'pdf')
+
+
+def _save_result(job, certificate, content, extension):
+    name = f'{get_valid_filename(certificate.title)}-certificates.{extension}'
+    job.result.save(name, File(content), save=False)
+    RenderJob.objects.filter(id=job.id).update(result=job.result.name)
+
@@ -0,0 +1,144 @@
+"""Layout plans for certificate text.
+
+A plan is built once per certificate (and output size) from its fields: it
+resolves fonts, colours and alignment up front. Placing rows then works a
+batch at a time, measuring each distinct value of a column once, so centred
+and right-aligned text and shrinking long values to ``max_width`` stay cheap
+however many rows are rendered. PNG, preview and PDF output all draw from
+the same placements.
+"""
+from collections import namedtuple
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageColor, ImageDraw
+
+from .fonts import load_font
+from .lru import MemoryLRU
+
+# Rasterized text by (text, font, size, colour)
+tile_cache = MemoryLRU(settings.TEXT_TILE_CACHE_MAX_BYTES)
+
+# Rows positioned per batch when rendering a whole sheet
+PLACE_BATCH_SIZE = 256
+
+# Text is never shrunk below this size to fit its max_width
+MIN_FONT_SIZE = 6
+
+# How far left of its anchor a line of text starts, as a fraction of its width
+_ALIGN_OFFSETS = {'left': 0.0, 'center': 0.5, 'right': 1.0}
+
+# One field with everything that does not depend on the row resolved; plain
+# values only, so plans can be sent to render processes
+FieldPlan = namedtuple(
+    'FieldPlan',
+    ['field_name', 'csv_column', 'x', 'y', 'font_family', 'font_size', 'fill', 'align', 'max_width'],
+)
+
+# One line of text ready to draw: (x, y) is the top-left of the text
+Placement = namedtuple('Placement', ['text', 'x', 'y', 'font_family', 'font_size', 'fill'])
+
+
+def _fill(color):
+    # Checked once here rather than failing the field on every row
+    try:
+        ImageColor.getrgb(color or 'black')
+    except ValueError:
+        return 'black'
+    return color or 'black'
+
+
+class LayoutPlan:
+    """The text layout of a certificate, with positions scaled by ``scale``."""
+
+    def __init__(self, fields, scale=1):
+        self.fields = tuple(
+            FieldPlan(
+                field.field_name,
+                field.csv_column,
+                round(field.x * scale),
+                round(field.y * scale),
+                field.font_family,
+                max(1, round(field.font_size * scale)),
+                _fill(field.font_color),
+                field.align if field.align in _ALIGN_OFFSETS else 'left',
+                round(field.max_width * scale) if field.max_width else None,
+            )
+            for field in fields
+        )
+
+    def place(self, rows):
+        """Return the placements of every field for each of ``rows``."""
+        rows = list(rows)
+        placed = [[] for _ in rows]
+        for field in self.fields:
+            texts = [str(row.get(field.csv_column, '')) for row in rows]
+            sizes, widths = self._fit(field, texts)
+            offsets = widths * _ALIGN_OFFSETS[field.align]
+            for placements, text, size, offset in zip(placed, texts, sizes.tolist(), offsets.tolist()):
+                placements.append(Placement(text, round(field.x - offset), field.y, field.font_family, size, field.fill))
+        return placed
+
+    def iter_placements(self, rows, batch_size=PLACE_BATCH_SIZE):
+        """Yield ``(row, placements)`` for every row, placing them a batch at a time."""
+        rows = iter(rows)
+        while batch := list(islice(rows, batch_size)):
+            yield from zip(batch, self.place(batch))
+
+    def _fit(self, field, texts):
+        """Font size and width of each text, shrunk where it is wider than max_width."""
+        values, inverse = np.unique(np.array(texts, dtype=object), return_inverse=True)
+        font = load_font(field.font_family, field.font_size)
+        widths = np.array([font.getlength(value) for value in values], dtype=float)
+        sizes = np.full(len(values), field.font_size)
+
+        if field.max_width:
+            over = np.flatnonzero(widths > field.max_width)
+            # Width grows about linearly with size; estimate, then step down where hinting disagrees
+            sizes[over] = np.maximum(MIN_FONT_SIZE, np.floor(field.font_size * field.max_width / widths[over]))
+            for i in over:
+                while True:
+                    widths[i] = load_font(field.font_family, int(sizes[i])).getlength(values[i])
+                    if widths[i] <= field.max_width or sizes[i] <= MIN_FONT_SIZE:
+                        break
+                    sizes[i] -= 1
+
+        return sizes[inverse], widths[inverse]
+
+
+def text_tile(placement):
+    """The text of ``placement`` alone on a transparent tile, and its offset from (x, y).
+
+    Tiles do not depend on where the text goes, so values repeated across
+    rows (dates, grades, the event name) are rasterized once per process.
+    """
+    key = (placement.text, placement.font_family, placement.font_size, placement.fill)
+    cached = tile_cache.get(key)
+    if cached is not None:
+        return cached
+
+    font = load_font(placement.font_family, placement.font_size)
+    left, top, right, bottom = font.getbbox(placement.text)
+    tile = Image.new('RGBA', (max(1, right - left), max(1, bottom - top)))
+    ImageDraw.Draw(tile).text((-left, -top), placement.text, font=font, fill=placement.fill)
+    cached = tile, (left, top)
+    tile_cache.put(key, cached, tile.width * tile.height * 4)
+    return cached
+
+
+def draw_text(img, placements):
+    """Composite the text tiles of ``placements`` onto an RGB or RGBA ``img`` in place.
+
+    Returns the box each tile covered.
+    """
+    boxes = []
+    for placement in placements:
+        tile, (left, top) = text_tile(placement)
+        position = (placement.x + left, placement.y + top)
+        if img.mode == 'RGBA':
+            img.alpha_composite(tile, position)
+        else:
+            img.paste(tile, position, tile)
+        boxes.append((*position, position[0] + tile.width, position[1] + tile.height))
+    return boxes
@@ -0,0 +1,158 @@
+"""Cached reads behind the verification endpoints.
+
+Entries live in the default cache, which every worker shares when CACHE_URL
+points at Redis. Keys carry a per-certificate version that the signals bump
+after any change is committed, so a changed certificate is never served from
+an old entry; old entries just expire.
+"""
+import hashlib
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .lru import MemoryLRU
+from .models import Certificate, CertificateField, CertificateRow
+from .rows import build_row_index, get_row, normalize_roll
+from .serializers import field_data
+
+# Roll-number sets of recently checked certificates with the time they
+# expire, tagged with the certificate version they were built under
+roll_sets = MemoryLRU(settings.ROLL_SET_CACHE_MAX_BYTES)
+
+
+def _version_key(certificate_id):
+    return f'certificate:{certificate_id}:version'
+
+
+def certificate_version(certificate_id):
+    key = _version_key(certificate_id)
+    version = cache.get(key)
+    if version is None:
+        # A fresh timestamp rather than 1, so an evicted version never
+        # brings back entries written under an earlier one
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(certificate_id):
+    cache.set(_version_key(certificate_id), time.time_ns(), None)
+
+
+def cached(certificate_id, name, compute, timeout=None):
+    """Return ``compute()`` through the cache; None results are not stored."""
+    version = certificate_version(certificate_id)
+    key = f'certificate:{certificate_id}:{name}'
+    value = cache.get(key, version=version)
+    if value is None:
+        value = compute()
+        if value is not None:
+            cache.set(key, value, timeout or settings.CERTIFICATE_CACHE_TIMEOUT, version=version)
+    return value
+
+
+def get_certificate(pk):
+    """The certificate with id ``pk``; raises Certificate.DoesNotExist like objects.get()."""
+    return cached(pk, 'certificate', lambda: Certificate.objects.get(id=pk))
+
+
+def get_fields(certificate_id):
+    """The certificate's fields, which make up its text layout."""
+    return cached(certificate_id, 'fields', lambda: list(CertificateField.objects.filter(certificate_id=certificate_id)))
+
+
+def info_data(pk):
+    def compute():
+        certificate = get_certificate(pk)
+        return {
+            'title': certificate.title,
+            'organization': certificate.organization
+        }
+    return cached(pk, 'info', compute)
+
+
+def details_data(pk, roll_no):
+    """The certificate_details payload for ``roll_no``, or None if it is not in the sheet."""
+    def compute():
+        certificate = get_certificate(pk)
+        row = get_row(certificate, roll_no)
+        if row is None:
+            return None
+        return {
+            'template': certificate.template.url,
+            'title': certificate.title,
+            'organization': certificate.organization,
+            'fields': field_data(get_fields(pk), row)
+        }
+
+    # Presigned template URLs must not outlive their signature
+    timeout = settings.CERTIFICATE_CACHE_TIMEOUT
+    if settings.MINIO_STORAGE_MEDIA_USE_PRESIGNED:
+        timeout = min(timeout, settings.PRESIGNED_URL_REFRESH_MARGIN)
+    roll_key = hashlib.sha1(normalize_roll(roll_no).encode()).hexdigest()
+    return cached(pk, f'details:{roll_key}', compute, timeout)
+
+
+class RollSet:
+    """Which roll numbers a certificate has, plus what a verification shows.
+
+    The normalized roll numbers are kept as one sorted bytes array, about
+    as many bytes per row as a roll number has characters, and looked up by
+    binary search. Small enough to pickle into the shared cache and to keep
+    in every worker for every certificate being verified.
+    """
+
+    def __init__(self, rolls, title, organization):
+        self.rolls = np.sort(np.array([normalize_roll(roll_no).encode() for roll_no in rolls], dtype=bytes))
+        self.title = title
+        self.organization = organization
+
+    def __contains__(self, roll_no):
+        key = normalize_roll(roll_no).encode()
+        i = np.searchsorted(self.rolls, key)
+        return bool(i < len(self.rolls) and self.rolls[i] == key)
+
+    def __len__(self):
+        return len(self.rolls)
+
+    @property
+    def nbytes(self):
+        return self.rolls.nbytes + len(self.title) + len(self.organization)
+
+
+def roll_set(pk):
+    """The RollSet of certificate ``pk``; raises Certificate.DoesNotExist like objects.get().
+
+    Built from the roll-number index once, shared through the cache and
+    then kept in each worker's memory until the certificate changes, and at
+    most as long as the cache keeps it, so a worker that missed a version
+    bump stops answering from it all the same.
+    """
+    def compute():
+        certificate = get_certificate(pk)
+        if certificate.row_count is None:
+            build_row_index(certificate)
+        rolls = CertificateRow.objects.filter(certificate_id=pk).values_list('roll_no', flat=True)
+        return RollSet(rolls.iterator(), certificate.title, certificate.organization)
+
+    version = certificate_version(pk)
+    entry = roll_sets.get(pk, tag=version)
+    if entry is None or entry[1] <= time.monotonic():
+        rolls = cached(pk, 'rolls', compute)
+        entry = rolls, time.monotonic() + settings.CERTIFICATE_CACHE_TIMEOUT
+        roll_sets.put(pk, entry, rolls.nbytes, tag=version)
+    return entry[0]
+
+
+def verify_data(pk, roll_no):
+    """The verify payload: whether ``roll_no`` has a certificate in ``pk``, and the event it is for."""
+    rolls = roll_set(pk)
+    return {
+        'certificate': pk,
+        'roll_no': normalize_roll(roll_no),
+        'found': roll_no in rolls,
+        'title': rolls.title,
+        'organization': rolls.organization,
+    }
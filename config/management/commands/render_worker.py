@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from config.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued certificate render jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Running {job.kind} job {job.id} for certificate {job.certificate_id}')
+            job = run_job(job)
+            self.stdout.write(f'Job {job.id} {job.status}: {job.done}/{job.total} rows')
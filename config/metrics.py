@@ -0,0 +1,200 @@
+"""Per-request timings by stage, reported as Server-Timing headers and Prometheus metrics.
+
+Code that does measurable work wraps it in ``stage(name)``; the middleware
+collects the stages of each request, adds them to the response as a
+Server-Timing header and observes them into histograms per route, which
+``/metrics`` exposes. Database time is collected for every query through a
+connection wrapper. Outside a request (render worker, management commands)
+stages cost a clock read and are dropped.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR so /metrics reports every
+worker rather than the one that happened to answer.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Stage durations (seconds) and sizes (bytes) of the request being handled
+_timings = ContextVar('certificate_timings', default=None)
+
+REQUEST_SECONDS = Histogram(
+    'certificate_request_duration_seconds', 'Time to produce a response, by route.',
+    ['route', 'method', 'status'],
+)
+STAGE_SECONDS = Histogram(
+    'certificate_stage_duration_seconds', 'Time spent per stage of a request, by route.',
+    ['route', 'stage'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+RESPONSE_BYTES = Histogram(
+    'certificate_response_bytes', 'Response body size, by route.',
+    ['route'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864),
+)
+RESPONSE_WRITE_SECONDS = Histogram(
+    'certificate_response_write_seconds', 'Time to send a streamed response body, by route.',
+    ['route'],
+)
+
+# Worker state no request times, sampled after every request and before a
+# scrape; under multiprocess mode the live workers' values are summed
+MINIO_CONNECTIONS = Gauge(
+    'certificate_minio_connections', 'Connections opened to MinIO by the shared pool.',
+    multiprocess_mode='livesum',
+)
+MINIO_REQUESTS = Gauge(
+    'certificate_minio_requests', 'Requests sent to MinIO through the shared pool.',
+    multiprocess_mode='livesum',
+)
+
+DATASET_CACHE_HITS = Gauge(
+    'certificate_dataset_cache_hits', 'Lookups answered from the in-memory dataset cache.',
+    multiprocess_mode='livesum',
+)
+DATASET_CACHE_MISSES = Gauge(
+    'certificate_dataset_cache_misses', 'Lookups that had to load the dataset.',
+    multiprocess_mode='livesum',
+)
+DATASET_CACHE_BYTES = Gauge(
+    'certificate_dataset_cache_bytes', 'Memory held by the dataset cache.',
+    multiprocess_mode='livesum',
+)
+
+
+@contextmanager
+def stage(name):
+    """Add the time spent in the block to stage ``name`` of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+
+def _time_query(execute, sql, params, many, context):
+    with stage('db'):
+        return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def sample_state():
+    # Imported here: datasets times its loads with stage()
+    from .datasets import dataset_cache
+    from .storage import connection_stats
+    minio = connection_stats()
+    MINIO_CONNECTIONS.set(minio['connections'])
+    MINIO_REQUESTS.set(minio['requests'])
+    datasets = dataset_cache.stats()
+    DATASET_CACHE_HITS.set(datasets['hits'])
+    DATASET_CACHE_MISSES.set(datasets['misses'])
+    DATASET_CACHE_BYTES.set(datasets['bytes'])
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+class TimingMiddleware:
+    """Time every request by stage; works under both WSGI and ASGI."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _timings.set({})
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            return self._finish(request, response, start)
+        finally:
+            _timings.reset(token)
+
+    async def __acall__(self, request):
+        token = _timings.set({})
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            return self._finish(request, response, start)
+        finally:
+            _timings.reset(token)
+
+    def _finish(self, request, response, start):
+        total = time.perf_counter() - start
+        timings = _timings.get()
+        route = _route(request)
+
+        REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(total)
+        sample_state()
+        for name, seconds in timings.items():
+            STAGE_SECONDS.labels(route, name).observe(seconds)
+
+        if settings.SERVER_TIMING:
+            entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items()]
+            entries.append(f'total;dur={total * 1000:.1f}')
+            response['Server-Timing'] = ', '.join(entries)
+
+        if response.streaming:
+            response.streaming_content = self._timed_stream(response, route)
+        else:
+            RESPONSE_BYTES.labels(route).observe(len(response.content))
+        return response
+
+    def _timed_stream(self, response, route):
+        # The body is sent after the middleware returns; time it as it goes out
+        content = response.streaming_content
+        if response.is_async:
+            return self._atimed(content, route)
+        return self._timed(content, route)
+
+    def _timed(self, content, route):
+        size = 0
+        start = time.perf_counter()
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+        RESPONSE_WRITE_SECONDS.labels(route).observe(time.perf_counter() - start)
+        RESPONSE_BYTES.labels(route).observe(size)
+
+    async def _atimed(self, content, route):
+        size = 0
+        start = time.perf_counter()
+        async for chunk in content:
+            size += len(chunk)
+            yield chunk
+        RESPONSE_WRITE_SECONDS.labels(route).observe(time.perf_counter() - start)
+        RESPONSE_BYTES.labels(route).observe(size)
+
+
+def metrics(request):
+    """Prometheus exposition of the request metrics and worker state."""
+    sample_state()
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -1,26 +1,109 @@
 from django.db import models
 from django.utils import timezone
-from minio_storage.storage import MinioMediaStorage
+from .storage import get_media_storage
 
 class Certificate(models.Model):
     id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=200)
     organization = models.CharField(max_length=200, default="ITC")
-    template = models.ImageField(upload_to='templates/', storage=MinioMediaStorage())
-    csv_data = models.FileField(upload_to='data/', storage=MinioMediaStorage())
+    template = models.ImageField(upload_to='templates/', storage=get_media_storage)
+    csv_data = models.FileField(upload_to='data/', storage=get_media_storage)
+    # Columnar copy of csv_data (see snapshots.py), empty for older uploads
+    csv_snapshot = models.FileField(upload_to='data/', storage=get_media_storage, blank=True)
     roll_column = models.CharField(max_length=200)
     verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
     user = models.CharField(max_length=30)
+    # Number of rows in the roll-number index, None until it has been built
+    row_count = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        # Back the (created_at, id) cursor pagination of the list endpoints
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),
+            models.Index(fields=['verified', '-created_at', '-id']),
+        ]
 
 
 class CertificateField(models.Model):
+    ALIGN_CHOICES = [
+        ('left', 'Left'),
+        ('center', 'Center'),
+        ('right', 'Right'),
+    ]
+
     id = models.AutoField(primary_key=True)
-    certificate = models.ForeignKey(Certificate, on_delete=models.CASCADE)
+    certificate = models.ForeignKey(Certificate, on_delete=models.CASCADE, related_name='fields')
     field_name = models.CharField(max_length=200)
     csv_column = models.CharField(max_length=200)
     x = models.IntegerField()
     y = models.IntegerField()
     font_size = models.IntegerField()
     font_color = models.CharField(max_length=30)
-    font_family = models.CharField(max_length=30) 
\ No newline at end of file
+    font_family = models.CharField(max_length=30)
+    # x is the left edge, centre or right edge of the text depending on align
+    align = models.CharField(max_length=10, choices=ALIGN_CHOICES, default='left')
+    # Longer values are drawn smaller so they fit, None to never shrink
+    max_width = models.IntegerField(null=True, blank=True)
+
+
+class CertificateRow(models.Model):
+    id = models.AutoField(primary_key=True)
+    certificate = models.ForeignKey(Certificate, on_delete=models.CASCADE, related_name='rows')
+    roll_no = models.CharField(max_length=200)
+    data = models.JSONField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['certificate', 'roll_no'], name='unique_certificate_roll_no'),
+        ]
+
+
+class RenderJob(models.Model):
+    KIND_CHOICES = [
+        ('zip', 'ZIP archive'),
+        ('pdf', 'Multi-page PDF'),
+        ('prerender', 'Pre-render'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    certificate = models.ForeignKey(Certificate, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='zip')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    total = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    result = models.FileField(upload_to='jobs/', storage=get_media_storage, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Written with progress while running; a job whose worker died stops updating it
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    @property
+    def throughput(self):
+        """Rows rendered per second so far."""
+        if not (self.started_at and self.done):
+            return None
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return self.done / elapsed if elapsed > 0 else None
+
+    @property
+    def eta(self):
+        """Estimated seconds until the job finishes."""
+        throughput = self.throughput
+        if not throughput:
+            return None
+        return max(self.total - self.done, 0) / throughput
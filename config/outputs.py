@@ -0,0 +1,164 @@
+import hashlib
+import json
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from minio.error import S3Error
+
+from .metrics import stage
+from .storage import get_media_storage, open_stream
+
+# Bump when the drawing code changes so previously rendered files are not reused
+RENDERER_VERSION = 4
+
+# Rendered outputs live on local disk, or with RENDER_CACHE_STORAGE=media in
+# the shared media storage, where every host (and the render worker) sees
+# the same files and clients can be redirected to them
+if settings.RENDER_CACHE_STORAGE == 'media':
+    output_storage = get_media_storage()
+    OUTPUT_PREFIX = 'renders/'
+else:
+    output_storage = FileSystemStorage(location=settings.RENDER_CACHE_ROOT, allow_overwrite=True)
+    OUTPUT_PREFIX = ''
+
+# Pillow format name, file extension and content type of each output format
+OUTPUT_FORMATS = {
+    'png': ('PNG', 'png', 'image/png'),
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+    'pdf': ('PDF', 'pdf', 'application/pdf'),
+}
+
+# What to render: ``width`` is a maximum width in pixels (None for the
+# template's own size) and ``quality`` only applies to lossy formats
+RenderOptions = namedtuple('RenderOptions', ['mode', 'output', 'width', 'quality'])
+
+DOWNLOAD = RenderOptions('download', 'png', None, None)
+PDF = RenderOptions('pdf', 'pdf', None, None)
+
+
+def render_options(mode, params):
+    """Build the RenderOptions for a generate request, raising ValueError on bad input.
+
+    ``download`` and ``pdf`` are full resolution. ``preview`` is scaled down
+    to ``width`` and encoded as WebP or JPEG, which is all the frontend needs
+    to show a certificate on screen.
+    """
+    if mode == 'download':
+        return DOWNLOAD
+    if mode == 'pdf':
+        return PDF
+    if mode != 'preview':
+        raise ValueError(f"Unknown mode '{mode}'")
+
+    output = params.get('output', settings.PREVIEW_OUTPUT)
+    if output not in ('webp', 'jpeg'):
+        raise ValueError("Preview output must be 'webp' or 'jpeg'")
+    try:
+        width = int(params.get('width', settings.PREVIEW_WIDTH))
+        quality = int(params.get('quality', settings.PREVIEW_QUALITY))
+    except ValueError:
+        raise ValueError('Width and quality must be integers')
+    if not 1 <= width <= settings.PREVIEW_MAX_WIDTH:
+        raise ValueError(f'Width must be between 1 and {settings.PREVIEW_MAX_WIDTH}')
+    if not 1 <= quality <= 95:
+        raise ValueError('Quality must be between 1 and 95')
+    return RenderOptions('preview', output, width, quality)
+
+
+def is_stored_output(options):
+    """Whether renders for ``options`` are kept in the output cache.
+
+    Only the full-size outputs and the default preview size are: every
+    other ?width= and ?quality= would add a file per row that nothing
+    cleans up until the certificate is deleted, so those are rendered on
+    each request instead.
+    """
+    if options.mode != 'preview':
+        return True
+    return options.width == settings.PREVIEW_WIDTH and options.quality == settings.PREVIEW_QUALITY
+
+
+def output_key(certificate, fields, row, options):
+    """Hash everything that affects a rendered certificate.
+
+    Any change to the template object, the field layout or the row values
+    produces a new key, so a cached output can never be served stale.
+    """
+    fields = sorted(fields, key=lambda field: field.id)
+    payload = {
+        'renderer': RENDERER_VERSION,
+        'template': certificate.template.name,
+        'fields': [
+            [field.field_name, field.csv_column, field.x, field.y,
+             field.font_size, field.font_color, field.font_family, field.align, field.max_width]
+            for field in fields
+        ],
+        'values': [str(row.get(field.csv_column, '')) for field in fields],
+        'options': list(options),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def output_format(options):
+    """File extension and content type of the output produced for ``options``."""
+    _, extension, content_type = OUTPUT_FORMATS[options.output]
+    return extension, content_type
+
+
+def output_name(certificate_id, key, extension):
+    return f'{OUTPUT_PREFIX}{certificate_id}/{key}.{extension}'
+
+
+def get_output(certificate_id, key, extension):
+    name = output_name(certificate_id, key, extension)
+    with stage('storage'):
+        if not output_storage.exists(name):
+            return None
+        with output_storage.open(name, 'rb') as output_file:
+            return output_file.read()
+
+
+def open_output(certificate_id, key, extension):
+    """Open a cached output for streaming; returns ``(file, size)`` or None."""
+    name = output_name(certificate_id, key, extension)
+    with stage('storage'):
+        # Size first: it is the cheap check for a missing output, before anything is opened
+        try:
+            size = output_storage.size(name)
+        except FileNotFoundError:
+            return None
+        except S3Error as e:
+            if e.code != 'NoSuchKey':
+                raise
+            return None
+        return open_stream(output_storage, name), size
+
+
+def save_output(certificate_id, key, extension, content):
+    name = output_name(certificate_id, key, extension)
+    # Same key, same bytes; storages without overwrite would save a renamed copy
+    with stage('storage'):
+        if OUTPUT_PREFIX and output_storage.exists(name):
+            return
+        output_storage.save(name, ContentFile(content))
+
+
+def output_url(certificate_id, key, extension):
+    """URL of a stored output clients can fetch directly, or None."""
+    name = output_name(certificate_id, key, extension)
+    if not OUTPUT_PREFIX or not output_storage.exists(name):
+        return None
+    return output_storage.url(name)
+
+
+def invalidate_outputs(certificate_id):
+    directory = f'{OUTPUT_PREFIX}{certificate_id}'
+    try:
+        _, files = output_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        output_storage.delete(f'{directory}/{name}')
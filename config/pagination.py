@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CertificateCursorPagination(CursorPagination):
+    """Keyset pagination over (created_at, id), newest first.
+
+    Pages are fetched with an indexed range query instead of an OFFSET, so
+    the cost of a page does not grow with the number of certificates.
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
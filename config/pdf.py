@@ -0,0 +1,70 @@
+import io
+
+from PIL import ImageColor
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .fonts import DEFAULT_FONT, load_font, resolve_font_path
+from .metrics import stage
+
+TEMPLATE_FORM = 'certificate-template'
+
+# reportlab font names already registered in this process, by font file
+_registered_fonts = {}
+
+
+def _pdf_font(family):
+    path = resolve_font_path(family)
+    if path not in _registered_fonts:
+        try:
+            name = f'certificate-font-{len(_registered_fonts)}'
+            pdfmetrics.registerFont(TTFont(name, path))
+        except Exception:
+            # Same fallback order as the PNG renderer, ending at a built-in font
+            name = _pdf_font(None) if path != DEFAULT_FONT else 'Helvetica'
+        _registered_fonts[path] = name
+    return _registered_fonts[path]
+
+
+def _fill_color(color):
+    try:
+        rgb = ImageColor.getrgb(color or 'black')
+    except ValueError:
+        rgb = (0, 0, 0)
+    return tuple(channel / 255 for channel in rgb[:3])
+
+
+def write_pdf(output, template, plan, rows):
+    """Write one PDF page per row to the file-like ``output``.
+
+    The template is embedded once as a form XObject that every page reuses,
+    and values are drawn as real (selectable, searchable) text placed by the
+    layout ``plan``. One template pixel maps to one point, so field
+    coordinates carry over unchanged.
+    """
+    width, height = template.size
+    pdf = canvas.Canvas(output, pagesize=(width, height))
+
+    pdf.beginForm(TEMPLATE_FORM)
+    pdf.drawImage(ImageReader(template), 0, 0, width, height, mask='auto')
+    pdf.endForm()
+
+    for _, placements in plan.iter_placements(rows):
+        pdf.doForm(TEMPLATE_FORM)
+        for placement in placements:
+            # Pillow positions text by the top of the ascender, PDF by the baseline
+            ascent = load_font(placement.font_family, placement.font_size).getmetrics()[0]
+            pdf.setFont(_pdf_font(placement.font_family), placement.font_size)
+            pdf.setFillColorRGB(*_fill_color(placement.fill))
+            pdf.drawString(placement.x, height - placement.y - ascent, placement.text)
+        pdf.showPage()
+    pdf.save()
+
+
+def render_pdf(template, plan, rows):
+    output = io.BytesIO()
+    with stage('encode'):
+        write_pdf(output, template, plan, rows)
+    return output.getvalue()
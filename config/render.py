@@ -0,0 +1,293 @@
+import fcntl
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from PIL import Image
+
+from .fonts import load_font
+from .layout import LayoutPlan, draw_text, tile_cache
+from .lru import MemoryLRU
+from .metrics import stage
+from .models import Certificate, CertificateField
+from .outputs import (
+    DOWNLOAD, OUTPUT_FORMATS, get_output, is_stored_output, output_format, output_key, save_output,
+)
+from .pdf import render_pdf
+
+# Decoded templates keyed by storage object name; the object name changes
+# whenever a template is replaced, so entries never need invalidating
+template_cache = MemoryLRU(settings.TEMPLATE_CACHE_MAX_BYTES)
+
+
+def load_template(certificate, width=None):
+    """Return the decoded template image of a certificate, in RGB or RGBA.
+
+    This is the base layer every row is drawn on: palette, greyscale and
+    CMYK templates are converted once here instead of on every render.
+    With ``width`` the template is scaled down to at most that many pixels
+    wide; scaled copies are cached alongside the original. The image is
+    shared by every request in the worker; draw on a copy.
+    """
+    name = certificate.template.name
+    img = template_cache.get(name)
+    if img is None:
+        with stage('storage'), certificate.template.open('rb') as template_file:
+            img = Image.open(template_file)
+            img.load()
+        img = normalize_mode(img)
+        template_cache.put(name, img, _image_size(img))
+    if width is None or width >= img.width:
+        return img
+
+    scaled = template_cache.get((name, width))
+    if scaled is None:
+        scaled = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        template_cache.put((name, width), scaled, _image_size(scaled))
+    return scaled
+
+
+def normalize_mode(img):
+    if img.mode in ('RGB', 'RGBA'):
+        return img
+    base = img.convert('RGBA' if img.has_transparency_data else 'RGB')
+    if img.mode == 'P' and base.mode == 'RGB':
+        # Kept so PNG output of palette templates can stay palette-encoded, see _encode_palette
+        base.info['palette_base'] = (img, img.getextrema()[1] + 1)
+    return base
+
+
+def _image_size(img):
+    size = img.width * img.height * len(img.getbands())
+    palette_base = img.info.get('palette_base')
+    if palette_base is not None:
+        size += palette_base[0].width * palette_base[0].height
+    return size
+
+
+def encode_image(img, output, quality=None):
+    pillow_format = OUTPUT_FORMATS[output][0]
+    options = {}
+    if quality is not None:
+        options['quality'] = quality
+    if pillow_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    img_byte_array = io.BytesIO()
+    with stage('encode'):
+        img.save(img_byte_array, format=pillow_format, **options)
+    return img_byte_array.getvalue()
+
+
+# Per-thread working copy of the last base layer drawn on, see draw_row
+_canvases = threading.local()
+
+
+def _canvas(template):
+    if getattr(_canvases, 'template', None) is not template:
+        _canvases.template = template
+        _canvases.img = template.copy()
+    return _canvases.img
+
+
+def draw_row(template, placements, output='png', quality=None):
+    """Composite one row's text onto the base layer and return the encoded image.
+
+    Rather than copying the whole template for every row, each thread keeps
+    one working copy and, after encoding, restores just the boxes the text
+    covered from the template.
+    """
+    with stage('draw'):
+        img = _canvas(template)
+        boxes = draw_text(img, placements)
+    try:
+        palette_base = template.info.get('palette_base')
+        if output == 'png' and palette_base is not None and palette_base[0].size == img.size:
+            encoded = _encode_palette(img, boxes, *palette_base)
+            if encoded is not None:
+                return encoded
+        return encode_image(img, output, quality)
+    finally:
+        for box in boxes:
+            img.paste(template.crop(box), box[:2])
+
+
+# Fewest free palette entries worth encoding a palette template's PNG with
+MIN_TEXT_COLORS = 16
+
+_palette_canvases = threading.local()
+
+
+def _encode_palette(img, boxes, palette_template, used):
+    """Encode a row drawn on a palette template as a palette PNG, or None if its palette is full.
+
+    A palette PNG is several times quicker to encode than RGB. The text
+    boxes get an adaptive palette of their own in the entries the template
+    leaves free; everything outside them keeps the template's indices.
+    """
+    free = 256 - used
+    if free < MIN_TEXT_COLORS:
+        return None
+    with stage('encode'):
+        if getattr(_palette_canvases, 'template', None) is not palette_template:
+            _palette_canvases.template = palette_template
+            _palette_canvases.img = palette_template.copy()
+        canvas = _palette_canvases.img
+
+        crops = [img.crop(box) for box in boxes]
+        strip = Image.new('RGB', (sum(crop.width for crop in crops) or 1, max((crop.height for crop in crops), default=1)))
+        offset = 0
+        for crop in crops:
+            strip.paste(crop, (offset, 0))
+            offset += crop.width
+        text_palette = strip.quantize(free, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE).getpalette()
+        palette = palette_template.getpalette()[:used * 3] + text_palette[:free * 3]
+        palette_image = Image.new('P', (1, 1))
+        palette_image.putpalette(palette)
+
+        canvas.putpalette(palette)
+        try:
+            for crop, box in zip(crops, boxes):
+                canvas.paste(crop.quantize(palette=palette_image, dither=Image.Dither.NONE), box[:2])
+            output = io.BytesIO()
+            canvas.save(output, format='PNG')
+            return output.getvalue()
+        finally:
+            for box in boxes:
+                canvas.paste(palette_template.crop(box), box[:2])
+
+
+def render_output(certificate, fields, row, options):
+    """Render one row as described by ``options`` (see outputs.render_options)."""
+    if options.output == 'pdf':
+        return render_pdf(load_template(certificate), LayoutPlan(fields), [row])
+
+    template = load_template(certificate, options.width)
+    # Field positions and sizes are stored in template pixels
+    scale = template.width / load_template(certificate).width
+    with stage('draw'):
+        placements, = LayoutPlan(fields, scale).place([row])
+    return draw_row(template, placements, options.output, options.quality)
+
+
+# Template of a render pool process, set once by _init_pool
+_pool_template = None
+
+
+def _init_pool(template):
+    global _pool_template
+    _pool_template = template
+    # Forked from a worker with live threads (database pool, async render
+    # executor): a cache lock may have been copied mid-update, held
+    tile_cache.reset()
+    load_font.cache_clear()
+
+
+def _render_in_pool(placements, output, quality):
+    return draw_row(_pool_template, placements, output, quality)
+
+
+def render_rows(certificate, fields, rows, options=DOWNLOAD, workers=None):
+    """Render many rows as described by ``options``, yielding ``(row, content)`` in input order.
+
+    Rows already in the output cache are served from it; the rest are laid
+    out here a batch at a time and drawn across a process pool of
+    ``workers`` (RENDER_POOL_WORKERS by default). Only a small window of
+    rows is in flight at a time, so memory stays flat however large the
+    sheet is. PDF output is not supported; see pdf.write_pdf.
+    """
+    fields = list(fields)
+    template = load_template(certificate, options.width)
+    plan = LayoutPlan(fields, template.width / load_template(certificate).width)
+    extension, _ = output_format(options)
+    if workers is None:
+        workers = settings.RENDER_POOL_WORKERS
+    pool = None
+    if workers > 1:
+        # Forked so the children share the configured Django app; spawned ones would
+        # start without settings. _init_pool makes the inherited caches safe to use
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                   initializer=_init_pool, initargs=(template,))
+
+    stored = is_stored_output(options)
+    pending = deque()
+    try:
+        for row, placements in plan.iter_placements(rows):
+            key = output_key(certificate, fields, row, options) if stored else None
+            content = get_output(certificate.id, key, extension) if stored else None
+            if content is None and pool is not None:
+                content = pool.submit(_render_in_pool, placements, options.output, options.quality)
+            elif content is None:
+                content = draw_row(template, placements, options.output, options.quality)
+                if stored:
+                    save_output(certificate.id, key, extension, content)
+            pending.append((row, key, content))
+
+            while pending and (len(pending) > workers * 2 or isinstance(pending[0][2], bytes)):
+                yield _finish(certificate, extension, *pending.popleft())
+        while pending:
+            yield _finish(certificate, extension, *pending.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+# Lock files of the bulk render slots, shared by every worker on the host
+RENDER_SLOT_DIR = os.path.join(tempfile.gettempdir(), 'certificate-render-slots')
+
+
+def claim_render_slot():
+    """Take one of this host's GENERATE_ALL_CONCURRENCY bulk render slots, returning it or None if all are busy.
+
+    A slot is an exclusive lock on a file, so claiming is atomic across
+    workers and the operating system releases it if the worker dies.
+    Give it back with release_render_slot.
+    """
+    os.makedirs(RENDER_SLOT_DIR, exist_ok=True)
+    for slot in range(settings.GENERATE_ALL_CONCURRENCY):
+        lock = open(os.path.join(RENDER_SLOT_DIR, f'{slot}.lock'), 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            continue
+        return lock
+    return None
+
+
+def release_render_slot(slot):
+    slot.close()
+
+
+def _finish(certificate, extension, row, key, content):
+    if not isinstance(content, bytes):
+        content = content.result()
+        if key is not None:
+            save_output(certificate.id, key, extension, content)
+    return row, content
+
+
+def warm_up(limit=None):
+    """Preload templates and fonts of the newest verified certificates.
+
+    Called once per worker at start so the first students to arrive do not
+    pay for fetching and decoding templates.
+    """
+    if limit is None:
+        limit = settings.RENDER_WARM_UP_CERTIFICATES
+    try:
+        certificates = list(Certificate.objects.filter(verified=True).order_by('-created_at')[:limit])
+    except Exception as e:
+        print("Error warming up renderer:", str(e))
+        return
+    for certificate in certificates:
+        try:
+            load_template(certificate)
+            for field in CertificateField.objects.filter(certificate=certificate):
+                load_font(field.font_family, field.font_size)
+        except Exception as e:
+            print(f"Error warming up certificate {certificate.id}: {str(e)}")
@@ -0,0 +1,106 @@
+import re
+
+from django.db import transaction
+
+from .datasets import load_dataset
+from .models import Certificate, CertificateRow
+from .snapshots import iter_snapshot_rows, remove_local_snapshots
+
+INDEX_BATCH_SIZE = 1000
+
+
+# Whole numbers written as floats (2101001.0), as spreadsheets and pandas export integer columns
+_FLOAT_INTEGER = re.compile(r'(\d+)\.0+')
+
+
+def normalize_roll(value):
+    """The roll number as the index stores it, whether it came from a sheet, a URL or an int."""
+    roll_no = str(value).strip()
+    match = _FLOAT_INTEGER.fullmatch(roll_no)
+    return match.group(1) if match else roll_no
+
+
+@transaction.atomic
+def build_row_index(certificate):
+    """Build the roll-number index of a certificate from its CSV.
+
+    Uploads are indexed by ingest.ingest_csv; this covers certificates
+    uploaded before the index existed or whose sheet was replaced since.
+    Duplicate roll numbers keep the first row, matching the old lookup
+    which always took the first match.
+    """
+    df = load_dataset(certificate)
+    if certificate.roll_column not in df.columns:
+        raise ValueError(f"Roll column '{certificate.roll_column}' not found in CSV")
+
+    rows = {}
+    for record in df.to_dict('records'):
+        roll_no = normalize_roll(record[certificate.roll_column])
+        rows.setdefault(roll_no, record)
+
+    CertificateRow.objects.filter(certificate=certificate).delete()
+    CertificateRow.objects.bulk_create(
+        (CertificateRow(certificate=certificate, roll_no=roll_no, data=data) for roll_no, data in rows.items()),
+        batch_size=INDEX_BATCH_SIZE,
+    )
+    certificate.row_count = len(rows)
+    certificate.save(update_fields=['row_count'])
+    return certificate.row_count
+
+
+def reset_row_index(certificate):
+    """Drop the roll-number index and snapshot of a certificate whose sheet or roll column changed.
+
+    The index is rebuilt from ``csv_data`` on the next lookup, and columns
+    are read from the CSV itself until the certificate is uploaded again.
+    """
+    CertificateRow.objects.filter(certificate=certificate).delete()
+    Certificate.objects.filter(pk=certificate.pk).update(row_count=None, csv_snapshot='')
+    certificate.row_count = None
+    snapshot = certificate.csv_snapshot
+    if snapshot:
+        storage, name = snapshot.storage, snapshot.name
+        certificate.csv_snapshot = ''
+        # Only once nothing can roll back to the old name
+        transaction.on_commit(lambda: storage.delete(name))
+    remove_local_snapshots(certificate.id)
+
+
+def get_row(certificate, roll_no):
+    """Return the CSV row of ``roll_no`` as a dict, or None if it is not in the sheet."""
+    if certificate.row_count is None:
+        # Certificates uploaded before the index existed are indexed on first use
+        build_row_index(certificate)
+    return (
+        CertificateRow.objects
+        .filter(certificate=certificate, roll_no=normalize_roll(roll_no))
+        .values_list('data', flat=True)
+        .first()
+    )
+
+
+def row_columns(certificate, fields):
+    """The columns rendering needs: the roll number and every field's column."""
+    return [certificate.roll_column] + [field.csv_column for field in fields]
+
+
+def iter_rows(certificate, columns=None):
+    """Yield every row of a certificate in sheet order.
+
+    When ``columns`` is given and the certificate has a columnar snapshot,
+    only those columns are read, straight from the snapshot. Otherwise
+    whole rows come from the roll-number index.
+    """
+    if columns is not None and certificate.csv_snapshot:
+        yield from iter_snapshot_rows(certificate, columns)
+        return
+
+    if certificate.row_count is None:
+        build_row_index(certificate)
+    rows = (
+        CertificateRow.objects
+        .filter(certificate=certificate)
+        .order_by('id')
+        .values_list('data', flat=True)
+    )
+    yield from rows.iterator(chunk_size=INDEX_BATCH_SIZE)
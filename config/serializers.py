@@ -1,7 +1,24 @@
 from rest_framework import serializers
-from .models import Certificate, CertificateField
+from .models import Certificate, CertificateField, RenderJob
 
-class CertificateSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """Let callers narrow a serializer with ``fields``, a comma-separated string or list.
+
+    Unknown names are ignored; leaving it out keeps every field.
+    """
+
+    def __init__(self, *args, **kwargs):
+        requested = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if requested:
+            if isinstance(requested, str):
+                requested = requested.split(',')
+            keep = {name.strip() for name in requested}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+
+class CertificateSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Certificate
         fields = ['id', 'title', 'template', 'organization', 'roll_column', 'verified', 'created_at', 'csv_data']
@@ -11,5 +28,60 @@ class CertificateFieldSerializer(serializers.ModelSerializer):
     class Meta:
         model = CertificateField
         fields = ['id', 'certificate', 'field_name', 'x', 'y', 'font_size', 
-                 'font_color', 'font_family']
+                 'font_color', 'font_family', 'align', 'max_width']
+
+
+class TemplateFieldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CertificateField
+        fields = ['field_name', 'x', 'y', 'font_size', 'font_color', 'font_family', 'align', 'max_width']
+
+
+class TemplateSerializer(serializers.ModelSerializer):
+    """A certificate with its field layout nested, for the template dashboard.
+
+    Expects the queryset to prefetch ``fields`` so a whole list costs two queries.
+    """
+
+    class Meta:
+        model = Certificate
+        fields = ['id', 'title', 'template', 'verified', 'organization', 'created_at', 'csv_data']
+
+    def to_representation(self, instance):
+        # "fields" can't be declared as a serializer field, it would shadow Serializer.fields
+        data = super().to_representation(instance)
+        data['fields'] = TemplateFieldSerializer(instance.fields.all(), many=True).data
+        return data
+
+
+class RenderJobSerializer(serializers.ModelSerializer):
+    throughput = serializers.FloatField(read_only=True)
+    eta = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = RenderJob
+        fields = ['id', 'certificate', 'kind', 'status', 'total', 'done', 'throughput', 'eta',
+                  'error', 'created_at', 'started_at', 'finished_at']
+
+
+def field_data(fields, row):
+    """Map each field to its value in ``row`` and its position and style.
 
+    Fields whose column is missing from the row are left out.
+    """
+    data = {}
+    for field in fields:
+        # Get the value from CSV using csv_column instead of field_name
+        csv_value = row.get(field.csv_column)
+        if csv_value is not None:
+            data[field.field_name] = {
+                'value': str(csv_value),
+                'x': field.x,
+                'y': field.y,
+                'font_size': field.font_size,
+                'font_color': field.font_color,
+                'font_family': field.font_family,
+                'align': field.align,
+                'max_width': field.max_width
+            }
+    return data
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.metrics.TimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise
@@ -61,7 +62,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'config.urls'
+ROOT_URLCONF = os.getenv('ROOT_URLCONF') or 'config.urls'
 
 TEMPLATES = [
     {
@@ -85,15 +86,39 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Each worker process keeps a psycopg connection pool; with DB_POOL=False
+# connections are kept open for DB_CONN_MAX_AGE seconds instead
+DB_POOL = (os.getenv('DB_POOL') or 'True') == 'True'
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE') or 600)
+DB_POOL_OPTIONS = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE') or 2),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE') or 10),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT') or 10),
+    'max_idle': float(os.getenv('DB_POOL_MAX_IDLE') or 600),
+    'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME') or 3600),
+}
+
+
+def pooled(database):
+    # Health checks also make the pool ping a connection before handing it out
+    database['CONN_HEALTH_CHECKS'] = True
+    if DB_POOL:
+        database['CONN_MAX_AGE'] = 0  # the pool owns connection lifetime
+        database.setdefault('OPTIONS', {})['pool'] = DB_POOL_OPTIONS
+    else:
+        database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    return database
+
+
 DATABASES = {
-    'default': {
+    'default': pooled({
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
-    }
+    })
 }
 
 # Security settings
@@ -121,11 +146,10 @@ if not os.path.exists(WHITENOISE_ROOT):
 
 # Database configuration for production
 if not DEBUG:
-    DATABASES['default'] = dj_database_url.config(
+    DATABASES['default'] = pooled(dj_database_url.config(
         default=os.getenv('DATABASE_URL'),
-        conn_max_age=600,
         ssl_require=True
-    )
+    ))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -208,19 +232,118 @@ DEFAULT_FILE_STORAGE = 'minio_storage.storage.MinioMediaStorage'
 STATICFILES_STORAGE = 'minio_storage.storage.MinioStaticStorage'
 
 # Minio Settings
-MINIO_STORAGE_ENDPOINT = os.getenv('MINIO_STORAGE_ENDPOINT', 'minio:9000')
+MINIO_STORAGE_ENDPOINT = os.getenv('MINIO_STORAGE_ENDPOINT') or 'minio:9000'
 MINIO_STORAGE_ACCESS_KEY = os.getenv('MINIO_STORAGE_ACCESS_KEY')
 MINIO_STORAGE_SECRET_KEY = os.getenv('MINIO_STORAGE_SECRET_KEY')
-MINIO_STORAGE_USE_HTTPS = os.getenv('MINIO_STORAGE_USE_HTTPS', 'True') == 'True'
-MINIO_STORAGE_MEDIA_BUCKET_NAME = os.getenv('MINIO_STORAGE_MEDIA_BUCKET_NAME', 'media')
+MINIO_STORAGE_USE_HTTPS = (os.getenv('MINIO_STORAGE_USE_HTTPS') or 'True') == 'True'
+MINIO_STORAGE_MEDIA_BUCKET_NAME = os.getenv('MINIO_STORAGE_MEDIA_BUCKET_NAME') or 'media'
 MINIO_STORAGE_AUTO_CREATE_MEDIA_BUCKET = True
 MINIO_STORAGE_STATIC_BUCKET_NAME = 'static'
 MINIO_STORAGE_AUTO_CREATE_STATIC_BUCKET = True
 
+# Connection pool shared by every MinIO request in a process
+MINIO_STORAGE_POOL_SIZE = int(os.getenv('MINIO_STORAGE_POOL_SIZE') or 10)
+MINIO_STORAGE_POOL_BLOCK = os.getenv('MINIO_STORAGE_POOL_BLOCK', 'False') == 'True'
+MINIO_STORAGE_CONNECT_TIMEOUT = float(os.getenv('MINIO_STORAGE_CONNECT_TIMEOUT') or 5)
+MINIO_STORAGE_READ_TIMEOUT = float(os.getenv('MINIO_STORAGE_READ_TIMEOUT') or 60)
+
+# Presigned media URLs: lifetime, how long before expiry a new one is signed,
+# and the size of the per-process cache of signed URLs
+MINIO_STORAGE_MEDIA_USE_PRESIGNED = os.getenv('MINIO_STORAGE_MEDIA_USE_PRESIGNED', 'False') == 'True'
+PRESIGNED_URL_EXPIRY = int(os.getenv('PRESIGNED_URL_EXPIRY') or 3600)
+PRESIGNED_URL_REFRESH_MARGIN = int(os.getenv('PRESIGNED_URL_REFRESH_MARGIN') or 300)
+PRESIGNED_URL_CACHE_MAX_BYTES = int(os.getenv('PRESIGNED_URL_CACHE_MAX_BYTES') or 4 * 1024 * 1024)
+
+# Backend for uploaded files: minio, filesystem (MEDIA_ROOT) or memory
+MEDIA_STORAGE_BACKEND = os.getenv('MEDIA_STORAGE_BACKEND') or 'minio'
+
+# Redirect CSV, job and stored certificate downloads to the storage URL instead
+# of streaming them through the app (the media bucket must be readable or use
+# presigned URLs)
+DOWNLOAD_REDIRECT = os.getenv('DOWNLOAD_REDIRECT', 'False') == 'True'
+
+# Cache shared by all workers. Lookups are invalidated by bumping a version
+# in it, so every worker must see the same cache: a redis:// URL, required
+# when web workers run on more than one host. Without one, the workers of a
+# host share a cache on disk in CACHE_DIR
+CACHE_URL = os.getenv('CACHE_URL')
+CACHE_DIR = os.getenv('CACHE_DIR') or BASE_DIR / 'django_cache'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES') or 10000)},
+    }
+}
+
+# Seconds certificate lookups (info, details, field layout) stay cached
+CERTIFICATE_CACHE_TIMEOUT = int(os.getenv('CERTIFICATE_CACHE_TIMEOUT') or 300)
+# Roll-number sets behind /verify/ kept in memory by each worker
+ROLL_SET_CACHE_MAX_BYTES = int(os.getenv('ROLL_SET_CACHE_MAX_BYTES') or 32 * 1024 * 1024)  # 32MB
+
+# Report per-stage timings of each request in a Server-Timing header
+SERVER_TIMING = (os.getenv('SERVER_TIMING') or 'True') == 'True'
+
 # File Upload Settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 
+# Parsed certificate CSVs kept in memory by each worker
+DATASET_CACHE_MAX_BYTES = int(os.getenv('DATASET_CACHE_MAX_BYTES') or 64 * 1024 * 1024)  # 64MB
+
+# Local, memory-mappable copies of the columnar CSV snapshots
+SNAPSHOT_CACHE_ROOT = os.getenv('SNAPSHOT_CACHE_ROOT') or BASE_DIR / 'snapshot_cache'
+
+# Rendered certificates, keyed by a hash of everything that went into them
+RENDER_CACHE_ROOT = os.getenv('RENDER_CACHE_ROOT') or BASE_DIR / 'render_cache'
+# Where they are kept: local (RENDER_CACHE_ROOT on each host) or media (the
+# shared media storage, required for pre-rendering from a separate worker)
+RENDER_CACHE_STORAGE = os.getenv('RENDER_CACHE_STORAGE') or 'local'
+
+# Render every row in the background when a certificate is uploaded or marked
+# verified, at most PRERENDER_RATE rows per second (0 for no limit) on
+# PRERENDER_WORKERS processes so live requests keep the CPU
+PRERENDER_CERTIFICATES = os.getenv('PRERENDER_CERTIFICATES', 'False') == 'True'
+PRERENDER_RATE = float(os.getenv('PRERENDER_RATE') or 10)
+PRERENDER_WORKERS = int(os.getenv('PRERENDER_WORKERS') or 1)
+
+# A running job that has not reported progress for RENDER_JOB_STALE_AFTER
+# seconds is taken to have lost its worker: it is queued again, or failed
+# once it has been started RENDER_JOB_MAX_ATTEMPTS times
+RENDER_JOB_STALE_AFTER = int(os.getenv('RENDER_JOB_STALE_AFTER') or 600)
+RENDER_JOB_MAX_ATTEMPTS = int(os.getenv('RENDER_JOB_MAX_ATTEMPTS') or 3)
+
+# Renderer caches: decoded templates and rasterized text (bounded by memory),
+# fonts by (family, size), how many verified certificates each worker
+# preloads at start and the number of processes used for bulk rendering
+TEMPLATE_CACHE_MAX_BYTES = int(os.getenv('TEMPLATE_CACHE_MAX_BYTES') or 256 * 1024 * 1024)  # 256MB
+TEXT_TILE_CACHE_MAX_BYTES = int(os.getenv('TEXT_TILE_CACHE_MAX_BYTES') or 32 * 1024 * 1024)  # 32MB
+FONT_CACHE_SIZE = int(os.getenv('FONT_CACHE_SIZE') or 256)
+RENDER_WARM_UP_CERTIFICATES = int(os.getenv('RENDER_WARM_UP_CERTIFICATES') or 20)
+RENDER_POOL_WORKERS = int(os.getenv('RENDER_POOL_WORKERS') or os.cpu_count() or 1)
+CERTIFICATE_FONT_DIRS = [
+    os.path.join(BASE_DIR, 'fonts'),
+    '/usr/share/fonts/truetype/dejavu',
+]
+
+# Streamed /generate-all/ archives rendered at once by the workers of a
+# host (each on RENDER_POOL_WORKERS processes); bigger events belong in a
+# zip job. REQUEST_TIMEOUT is gunicorn's worker timeout.
+GENERATE_ALL_CONCURRENCY = int(os.getenv('GENERATE_ALL_CONCURRENCY') or 2)
+REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT') or 300)
+
+# Renders one ASGI worker runs at once; the async views queue the rest
+ASYNC_RENDER_WORKERS = int(os.getenv('ASYNC_RENDER_WORKERS') or os.cpu_count() or 1)
+
+# Defaults for mode=preview renders; ?width=, ?output= and ?quality= override them
+PREVIEW_WIDTH = int(os.getenv('PREVIEW_WIDTH') or 1000)
+PREVIEW_MAX_WIDTH = int(os.getenv('PREVIEW_MAX_WIDTH') or 2000)
+PREVIEW_OUTPUT = os.getenv('PREVIEW_OUTPUT') or 'webp'
+PREVIEW_QUALITY = int(os.getenv('PREVIEW_QUALITY') or 80)
+
 # Content Types
 CONTENT_TYPES = ['image/jpeg', 'image/png', 'application/pdf']
 MAX_UPLOAD_SIZE = 5242880  # 5MB
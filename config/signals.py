@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .datasets import dataset_cache
+from .jobs import schedule_prerender
+from .lookups import bump_version
+from .models import Certificate, CertificateField
+from .outputs import invalidate_outputs
+from .rows import reset_row_index
+from .snapshots import remove_local_snapshots
+
+
+# Columns whose change means the certificate renders differently
+STORED_FILES = ('template', 'csv_data', 'csv_snapshot')
+# Columns the roll-number index and the snapshot are built from
+INDEXED = ('csv_data', 'roll_column')
+
+
+@receiver(pre_save, sender=Certificate)
+def remember_stored(sender, instance, update_fields=None, **kwargs):
+    # The saved verified flag, file names and roll column, to tell real changes from bookkeeping saves
+    instance._stored = None
+    if instance.pk is not None and (update_fields is None
+                                    or {'verified', 'roll_column', *STORED_FILES} & set(update_fields)):
+        instance._stored = (
+            Certificate.objects.filter(pk=instance.pk).values('verified', 'roll_column', *STORED_FILES).first()
+        )
+
+
+@receiver(post_save, sender=Certificate)
+def prerender_verified(sender, instance, update_fields=None, **kwargs):
+    # Verification is when students start asking for their certificates
+    stored = instance._stored
+    if (instance.verified and stored is not None and stored['verified'] is False
+            and (update_fields is None or 'verified' in update_fields)):
+        schedule_prerender(instance)
+
+
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+def invalidate_certificate_caches(sender, instance, **kwargs):
+    # Bump once the change is visible, or another worker could cache the old rows under the new version
+    certificate_id = instance.id
+    transaction.on_commit(lambda: bump_version(certificate_id))
+
+    if kwargs['signal'] is post_delete:
+        dataset_cache.invalidate(instance.id)
+        invalidate_outputs(instance.id)
+        remove_local_snapshots(instance.id)
+        return
+
+    # Outputs are keyed by a hash of what went into them and never go stale;
+    # only a replaced template or sheet leaves old ones behind to clean up.
+    # Verifying and other saves keep everything pre-rendered so far
+    stored = getattr(instance, '_stored', None)
+    if stored is None:
+        return
+    # A sheet replaced after upload (the admin change form does this) or a
+    # new roll column leaves the index and snapshot describing the old one
+    reindex = stored['csv_data'] and (stored['csv_data'] != instance.csv_data.name
+                                      or stored['roll_column'] != instance.roll_column)
+    if reindex:
+        reset_row_index(instance)
+    elif all(stored[name] == getattr(instance, name).name for name in STORED_FILES):
+        return
+    dataset_cache.invalidate(instance.id)
+    if stored['template'] or stored['csv_data']:
+        invalidate_outputs(instance.id)
+
+
+@receiver(post_save, sender=CertificateField)
+@receiver(post_delete, sender=CertificateField)
+def invalidate_field_caches(sender, instance, **kwargs):
+    # Outputs of the old layout are left to the certificate's next file change or deletion
+    certificate_id = instance.certificate_id
+    transaction.on_commit(lambda: bump_version(certificate_id))
@@ -0,0 +1,123 @@
+import csv
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+from django.conf import settings
+
+from .streaming import decoded_lines
+
+HEADER_KEY = 'columns'
+
+
+def _column_key(index):
+    return f'c{index}'
+
+
+def write_snapshot(csv_file):
+    """Convert a UTF-8 CSV (a Django File) into a columnar NumPy snapshot.
+
+    Every column becomes a fixed-width array of UTF-8 bytes in an
+    uncompressed .npz, so readers can memory-map just the columns they need
+    instead of parsing the whole sheet. Two passes over the file: one to size
+    the columns, one to fill them. The columns are filled in memory-mapped
+    scratch files rather than in memory, so one long value in a large sheet
+    costs disk, not RAM. Returns the .npz in a temporary file.
+    """
+    rows = csv.reader(decoded_lines(csv_file, 'utf-8'))
+    header = next(rows)
+    widths = [1] * len(header)
+    count = 0
+    for values in rows:
+        count += 1
+        for index, value in enumerate(values[:len(header)]):
+            widths[index] = max(widths[index], len(value.encode('utf-8')))
+
+    snapshot = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    with tempfile.TemporaryDirectory() as scratch:
+        paths = [os.path.join(scratch, f'{_column_key(index)}.npy') for index in range(len(header))]
+        if count:
+            arrays = [
+                np.lib.format.open_memmap(path, mode='w+', dtype=f'S{width}', shape=(count,))
+                for path, width in zip(paths, widths)
+            ]
+            rows = csv.reader(decoded_lines(csv_file, 'utf-8'))
+            next(rows)
+            for position, values in enumerate(rows):
+                for index, value in enumerate(values[:len(header)]):
+                    arrays[index][position] = value.encode('utf-8')
+            for array in arrays:
+                array.flush()
+            del arrays
+        else:
+            # Empty files cannot be memory-mapped
+            for path, width in zip(paths, widths):
+                np.save(path, np.zeros(0, dtype=f'S{width}'))
+
+        # The same layout np.savez writes
+        with zipfile.ZipFile(snapshot, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            with archive.open(f'{HEADER_KEY}.npy', 'w', force_zip64=True) as entry:
+                np.lib.format.write_array(entry, np.array([column.encode('utf-8') for column in header]))
+            for path in paths:
+                archive.write(path, os.path.basename(path))
+    snapshot.seek(0)
+    return snapshot
+
+
+def _local_directory(certificate):
+    digest = hashlib.sha1(certificate.csv_snapshot.name.encode()).hexdigest()[:16]
+    return os.path.join(settings.SNAPSHOT_CACHE_ROOT, str(certificate.id), digest)
+
+
+def _ensure_local(certificate):
+    # Unpack the snapshot to local disk once per host so columns can be
+    # memory-mapped; the directory is renamed into place only when complete
+    directory = _local_directory(certificate)
+    if os.path.isdir(directory):
+        return directory
+
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent)
+    try:
+        with certificate.csv_snapshot.open('rb') as snapshot, zipfile.ZipFile(snapshot) as archive:
+            archive.extractall(staging)
+        os.rename(staging, directory)
+    except OSError:
+        # Another worker finished unpacking first
+        if not os.path.isdir(directory):
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return directory
+
+
+def load_columns(certificate, columns):
+    """Return ``{column: array}`` for the requested columns of a certificate's snapshot.
+
+    Values are UTF-8 bytes; columns not in the sheet are left out. Arrays
+    are read-only memory maps, so only the pages actually touched are
+    loaded.
+    """
+    directory = _ensure_local(certificate)
+    header = [column.decode('utf-8') for column in np.load(os.path.join(directory, f'{HEADER_KEY}.npy'))]
+    arrays = {}
+    for column in dict.fromkeys(columns):
+        if column in header:
+            path = os.path.join(directory, f'{_column_key(header.index(column))}.npy')
+            arrays[column] = np.load(path, mmap_mode='r')
+    return arrays
+
+
+def iter_snapshot_rows(certificate, columns):
+    arrays = load_columns(certificate, columns)
+    count = len(next(iter(arrays.values()))) if arrays else 0
+    for position in range(count):
+        yield {column: array[position].decode('utf-8') for column, array in arrays.items()}
+
+
+def remove_local_snapshots(certificate_id):
+    shutil.rmtree(os.path.join(settings.SNAPSHOT_CACHE_ROOT, str(certificate_id)), ignore_errors=True)
@@ -0,0 +1,202 @@
+import socket
+import threading
+import time
+from datetime import timedelta
+
+import certifi
+import urllib3
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
+from django.utils.deconstruct import deconstructible
+from minio_storage.policy import Policy
+from minio_storage.storage import MinioStorage, create_minio_client_from_settings, get_setting
+
+from .lru import MemoryLRU
+
+_lock = threading.RLock()
+_http_client = None
+_media_storage = None
+
+# Presigned URLs by (object name, lifetime), shared by every response in the process
+url_cache = MemoryLRU(settings.PRESIGNED_URL_CACHE_MAX_BYTES)
+
+
+def get_http_client():
+    """The urllib3 pool shared by every MinIO call in this process."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = urllib3.PoolManager(
+                maxsize=settings.MINIO_STORAGE_POOL_SIZE,
+                block=settings.MINIO_STORAGE_POOL_BLOCK,
+                timeout=urllib3.Timeout(
+                    connect=settings.MINIO_STORAGE_CONNECT_TIMEOUT,
+                    read=settings.MINIO_STORAGE_READ_TIMEOUT,
+                ),
+                retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+                # Keep idle connections to MinIO open between requests
+                socket_options=urllib3.connection.HTTPConnection.default_socket_options + [
+                    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+                ],
+                cert_reqs='CERT_REQUIRED',
+                ca_certs=certifi.where(),
+            )
+        return _http_client
+
+
+def connection_stats():
+    """Requests sent to MinIO and connections opened for them, summed over every pool."""
+    stats = {'pools': 0, 'connections': 0, 'requests': 0}
+    if _http_client is None:
+        return stats
+    for key in _http_client.pools.keys():
+        pool = _http_client.pools.get(key)
+        if pool is None:
+            continue
+        stats['pools'] += 1
+        stats['connections'] += pool.num_connections
+        stats['requests'] += pool.num_requests
+    stats['reused'] = stats['requests'] - stats['connections']
+    return stats
+
+
+@deconstructible
+class PooledMinioMediaStorage(MinioStorage):
+    """The media bucket of django-minio-storage's MinioMediaStorage on the shared connection pool.
+
+    Reads the same MINIO_STORAGE_* settings; only the HTTP client differs.
+    Presigned URLs are cached until shortly before they expire, so listing a
+    page of certificates does not sign every template and CSV again.
+    """
+
+    def __init__(self):
+        client = create_minio_client_from_settings(minio_kwargs={'http_client': get_http_client()})
+        auto_create_policy = get_setting('MINIO_STORAGE_AUTO_CREATE_MEDIA_POLICY', 'GET_ONLY')
+        policy_type = Policy.get
+        if isinstance(auto_create_policy, str):
+            policy_type = Policy(auto_create_policy)
+            auto_create_policy = True
+
+        super().__init__(
+            client,
+            get_setting('MINIO_STORAGE_MEDIA_BUCKET_NAME'),
+            base_url=get_setting('MINIO_STORAGE_MEDIA_URL', None),
+            auto_create_bucket=get_setting('MINIO_STORAGE_AUTO_CREATE_MEDIA_BUCKET', False),
+            auto_create_policy=auto_create_policy,
+            policy_type=policy_type,
+            presign_urls=get_setting('MINIO_STORAGE_MEDIA_USE_PRESIGNED', False),
+            backup_format=get_setting('MINIO_STORAGE_MEDIA_BACKUP_FORMAT', False),
+            backup_bucket=get_setting('MINIO_STORAGE_MEDIA_BACKUP_BUCKET', False),
+            assume_bucket_exists=get_setting('MINIO_STORAGE_ASSUME_MEDIA_BUCKET_EXISTS', False),
+            object_metadata=get_setting('MINIO_STORAGE_MEDIA_OBJECT_METADATA', None),
+        )
+
+    def url(self, name, *args, max_age=None):
+        if not self.presign_urls:
+            return super().url(name, *args, max_age=max_age)
+        if max_age is None:
+            max_age = timedelta(seconds=settings.PRESIGNED_URL_EXPIRY)
+        key = (name, max_age)
+        cached = url_cache.get(key)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        url = super().url(name, *args, max_age=max_age)
+        # Hand out a fresh URL once the cached one gets close to expiring
+        refresh_at = now + max_age.total_seconds() - settings.PRESIGNED_URL_REFRESH_MARGIN
+        url_cache.put(key, (url, refresh_at), len(url))
+        return url
+
+    def delete(self, name):
+        super().delete(name)
+        for key in url_cache.keys():
+            if key[0] == name:
+                url_cache.invalidate(key)
+
+
+@deconstructible
+class ThreadSafeInMemoryStorage(InMemoryStorage):
+    """InMemoryStorage hands every reader the same file object; give each its own copy."""
+
+    def _open(self, name, mode='rb'):
+        with _lock:
+            content = super()._open(name, mode).read()
+        return ContentFile(content, name=name)
+
+
+class MinioObjectStream:
+    """A MinIO object read straight from the response, only the part that is sent.
+
+    The storage's own files download the whole object into a spooled
+    temporary file on the first read. This fetches nothing until read, then
+    issues one GET for the selected byte range, so only what goes to the
+    client passes through the worker.
+    """
+
+    def __init__(self, storage, name):
+        self._storage = storage
+        self.name = name
+        self._offset = 0
+        self._length = 0
+        self._response = None
+
+    def select(self, offset, length=None):
+        """Read ``length`` bytes from ``offset`` (to the end when None); only before reading."""
+        if self._response is not None:
+            raise OSError('Cannot select a range once reading has started')
+        self._offset = offset
+        self._length = length or 0
+
+    def seek(self, offset):
+        self.select(offset)
+        return offset
+
+    def read(self, size=-1):
+        if self._response is None:
+            self._response = self._storage.client.get_object(
+                self._storage.bucket_name, self.name, offset=self._offset, length=self._length,
+            )
+        return self._response.read(None if size is None or size < 0 else size)
+
+    def close(self):
+        if self._response is not None:
+            # A response read to the end leaves its connection ready for the
+            # next request; closing it would drop the pooled socket, so only
+            # a partly read one (client gone mid-download) is closed
+            if self._response.length_remaining != 0:
+                self._response.close()
+            self._response.release_conn()
+            self._response = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_stream(storage, name):
+    """Open a stored file for sending to a client in chunks (see streaming.file_response)."""
+    if isinstance(storage, MinioStorage):
+        return MinioObjectStream(storage, name)
+    return storage.open(name, 'rb')
+
+
+def get_media_storage():
+    """The storage behind every file field, created once per process.
+
+    MEDIA_STORAGE_BACKEND picks MinIO (the default), a local directory or an
+    in-memory stand-in for running without a MinIO server.
+    """
+    global _media_storage
+    with _lock:
+        if _media_storage is None:
+            backend = settings.MEDIA_STORAGE_BACKEND
+            if backend == 'memory':
+                _media_storage = ThreadSafeInMemoryStorage(base_url=settings.MEDIA_URL)
+            elif backend == 'filesystem':
+                _media_storage = FileSystemStorage(location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL)
+            else:
+                _media_storage = PooledMinioMediaStorage()
+        return _media_storage
@@ -0,0 +1,201 @@
+import codecs
+import re
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+
+
+class _ZipSink:
+    """Write-only, non-seekable target for ZipFile that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive of ``(name, bytes)`` entries chunk by chunk.
+
+    Entries are stored uncompressed (PNG and PDF are compressed already) and
+    only the current entry is ever held in memory.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, content in entries:
+            archive.writestr(name, content)
+            yield sink.drain()
+    yield sink.drain()
+
+
+class ClosingStream:
+    """Streaming response content that calls ``on_close`` once the response is closed.
+
+    Django closes every response whether or not its body was sent, so this
+    also runs for a stream abandoned before its first chunk, where the
+    ``finally`` of a generator that never started does not.
+    """
+
+    def __init__(self, chunks, on_close):
+        self._chunks = chunks
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        try:
+            if hasattr(self._chunks, 'close'):
+                self._chunks.close()
+        finally:
+            self._on_close()
+
+
+class AsyncClosingStream(ClosingStream):
+    """ClosingStream over an async iterator, for responses of async views."""
+
+    __iter__ = None
+
+    def __aiter__(self):
+        return aiter(self._chunks)
+
+
+_DONE = object()
+
+
+async def iterate_in_thread(iterable):
+    """Yield the items of a blocking iterable, each produced in the request's sync thread.
+
+    The ASGI handler reads a sync StreamingHttpResponse to the end before
+    sending any of it; async views wrap slow generators in this instead so
+    every chunk goes out as soon as it is ready.
+    """
+    iterator = await sync_to_async(iter)(iterable)
+    step = sync_to_async(next)
+    try:
+        while True:
+            item = await step(iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+
+def decoded_lines(csv_file, encoding):
+    """Yield the lines of a Django File decoded chunk by chunk, never reading it whole."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pending = ''
+    for chunk in csv_file.chunks():
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        # The last piece may be a partial line, keep it for the next chunk
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+FILE_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """Resolve a Range header against a file of ``size`` bytes.
+
+    Returns an inclusive ``(start, end)``, or None when the whole file should
+    be sent (no header, several ranges or a unit other than bytes). Raises
+    ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # "bytes=-N" asks for the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _read_chunks(file, length):
+    try:
+        while length > 0:
+            chunk = file.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+async def _aread_chunks(file, length):
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while length > 0:
+            chunk = await read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+def file_response(request, file, size, content_type, filename, as_attachment=False, asynchronous=False):
+    """Stream an open binary ``file`` in chunks, honouring a single-range Range header.
+
+    The file is closed once it has been sent. Pass ``asynchronous=True`` from
+    async views so chunks are read in a thread instead of being buffered by
+    the ASGI handler.
+    """
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    if hasattr(file, 'select'):
+        # Streams that fetch lazily (storage.MinioObjectStream) ask for just this range
+        file.select(start, length)
+    elif start:
+        file.seek(start)
+    chunks = _aread_chunks(file, length) if asynchronous else _read_chunks(file, length)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type, status=206 if byte_range else 200)
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    disposition = 'attachment' if as_attachment else 'inline'
+    response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    return response
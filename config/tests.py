@@ -0,0 +1,224 @@
+"""Run without outside services:
+
+    python manage.py test config.tests --settings=benchmarks.settings
+"""
+import io
+import json
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from PIL import Image
+
+from .datasets import dataset_cache
+from .lookups import RollSet, roll_sets
+from .models import Certificate, CertificateField
+from .streaming import parse_range
+
+
+def create_certificate(user, title, fields=2, csv=b'roll,name\n1,Alice\n'):
+    certificate = Certificate.objects.create(
+        title=title,
+        template=ContentFile(b'template', name='template.png'),
+        csv_data=ContentFile(csv, name='data.csv'),
+        roll_column='roll',
+        user=user,
+    )
+    for i in range(fields):
+        CertificateField.objects.create(
+            certificate=certificate, field_name=f'field {i}', csv_column='name',
+            x=10, y=10 * i, font_size=24, font_color='#000000', font_family='DejaVuSans',
+        )
+    return certificate
+
+
+class UserTemplatesTests(TestCase):
+    def test_one_certificate(self):
+        create_certificate('alice', 'Event')
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/templates/alice/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(len(response.json()[0]['fields']), 2)
+
+    def test_query_count_does_not_grow_with_certificates(self):
+        for i in range(10):
+            create_certificate('alice', f'Event {i}', fields=i % 3)
+        create_certificate('bob', 'Other event')
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/templates/alice/')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data), 10)
+        self.assertEqual(sorted(len(template['fields']) for template in data), [0, 0, 0, 0, 1, 1, 1, 2, 2, 2])
+
+
+def template_png():
+    output = io.BytesIO()
+    Image.new('RGB', (400, 300), 'white').save(output, 'PNG')
+    return output.getvalue()
+
+
+class CertificateTestCase(TestCase):
+    def setUp(self):
+        # Lookups are cached by certificate id, which the test database hands out again
+        cache.clear()
+        dataset_cache.clear()
+        roll_sets.clear()
+
+    def upload(self, csv):
+        return self.client.post('/upload/', {
+            'title': 'Event',
+            'organization': 'ITC',
+            'roll_column': 'roll',
+            'user': 'alice',
+            'variables': json.dumps([{
+                'field_name': 'Name', 'csv_column': 'name', 'x': 10, 'y': 10,
+                'font_size': 24, 'font_color': 'black', 'font_family': 'DejaVuSans',
+            }]),
+            'csv_file': SimpleUploadedFile('sheet.csv', csv, content_type='text/csv'),
+            'template': SimpleUploadedFile('template.png', template_png(), content_type='image/png'),
+        })
+
+
+class UploadValidationTests(CertificateTestCase):
+    def test_missing_roll_column(self):
+        response = self.upload(b'id,name\n1,Alice\n')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details'], ["Column 'roll' not found in CSV"])
+        self.assertFalse(Certificate.objects.exists())
+
+    def test_blank_roll_numbers(self):
+        response = self.upload(b'roll,name\n1,Alice\n,Bob\n  ,Carol\n4,Dan\n')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details'], ['Missing roll number on line(s) 3, 4'])
+        self.assertFalse(Certificate.objects.exists())
+
+    def test_duplicate_roll_numbers(self):
+        # 2101001.0 is how spreadsheets export the integer 2101001
+        response = self.upload(b'roll,name\n2101001,Alice\n2101002,Bob\n2101001.0,Carol\n2101002,Dan\n')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details'], ['Duplicate roll number(s): 2101001, 2101002'])
+
+    def test_blank_lines_are_skipped(self):
+        response = self.upload(b'roll,name\n1,Alice\n\n,\n2,Bob\n')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Certificate.objects.get().row_count, 2)
+
+    def test_latin1_sheet(self):
+        names = ['José Núñez', 'Zoë Brontë', 'François Lefèvre', 'Ángela Muñoz']
+        csv = 'roll,name\n' + ''.join(f'{i},{name}\n' for i, name in enumerate(names, 1))
+        response = self.upload(csv.encode('latin-1'))
+
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()['id']
+        for i, name in enumerate(names, 1):
+            self.assertEqual(self.client.get(f'/certificate/{pk}/details/{i}/').json()['fields']['Name']['value'], name)
+        # Stored re-encoded as UTF-8
+        self.assertIn('José Núñez'.encode(), b''.join(self.client.get(f'/certificate/{pk}/csv/alice/').streaming_content))
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_whole_file(self):
+        for header in (None, '', 'bytes=-', 'items=0-10', 'bytes=0-1,5-6'):
+            self.assertIsNone(parse_range(header, 100), header)
+
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        # Open-ended: from the offset to the end
+        self.assertEqual(parse_range('bytes=10-', 100), (10, 99))
+        # Suffix: the last N bytes, all of them when N is larger than the file
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+
+    def test_unsatisfiable(self):
+        for header in ('bytes=100-', 'bytes=150-200', 'bytes=10-5'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 100)
+
+
+class RangeRequestTests(CertificateTestCase):
+    def setUp(self):
+        super().setUp()
+        pk = self.upload(b'roll,name\n1,Alice\n2,Bob\n').json()['id']
+        self.url = f'/certificate/{pk}/csv/alice/'
+        # The sheet as stored, re-encoded on upload
+        self.csv = b''.join(self.client.get(self.url).streaming_content)
+
+    def get(self, header):
+        response = self.client.get(self.url, headers={'Range': header})
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_suffix_range(self):
+        response, body = self.get('bytes=-4')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.csv[-4:])
+        self.assertEqual(response['Content-Range'], f'bytes {len(self.csv) - 4}-{len(self.csv) - 1}/{len(self.csv)}')
+
+    def test_open_ended_range(self):
+        response, body = self.get('bytes=10-')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.csv[10:])
+        self.assertEqual(response['Content-Length'], str(len(self.csv) - 10))
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(f'bytes={len(self.csv)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.csv)}')
+
+
+class VerifyRollTests(CertificateTestCase):
+    def verify(self, pk, roll_no):
+        response = self.client.get(f'/certificate/{pk}/verify/{roll_no}/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_float_roll_numbers_in_the_sheet(self):
+        pk = self.upload(b'roll,name\n2101001.0,Alice\n').json()['id']
+
+        self.assertTrue(self.verify(pk, '2101001')['found'])
+        self.assertTrue(self.verify(pk, '2101001.0')['found'])
+        self.assertEqual(self.verify(pk, '2101001.0')['roll_no'], '2101001')
+        self.assertFalse(self.verify(pk, '2101002')['found'])
+
+    def test_float_roll_numbers_in_the_url(self):
+        pk = self.upload(b'roll,name\n2101001,Alice\n').json()['id']
+
+        self.assertTrue(self.verify(pk, '2101001.00')['found'])
+        self.assertFalse(self.verify(pk, '2101001.5')['found'])
+
+    def test_certificate_indexed_on_first_use(self):
+        # Uploaded before the roll-number index: built from the stored CSV
+        certificate = create_certificate('alice', 'Event', csv=b'roll,name\n2101001.0,Alice\n')
+
+        self.assertTrue(self.verify(certificate.id, '2101001')['found'])
+
+    def test_int_roll_numbers(self):
+        rolls = RollSet([2101001, '2101002.0', ' 2101003 '], 'Event', 'ITC')
+
+        for roll_no in (2101001, '2101001', '2101001.0', 2101002, '2101002', ' 2101003'):
+            self.assertIn(roll_no, rolls)
+        self.assertNotIn(2101004, rolls)
+        self.assertNotIn('210100', rolls)
+
+
+class GenerateCertificateTests(CertificateTestCase):
+    def test_unknown_certificate(self):
+        response = self.client.get('/certificate/999/generate/1/')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Certificate not found'})
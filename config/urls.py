@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from . import views
+from . import metrics, views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -14,8 +14,14 @@ urlpatterns = [
     path('certificate/<int:pk>/preview/', views.certificate_preview),
     path('templates/<str:user>/', views.user_templates),
     path('certificate/<int:pk>/details/<str:roll_no>/', views.certificate_details),
+    path('certificate/<int:pk>/verify/<str:roll_no>/', views.verify_roll),
     path('certificate/<int:pk>/info/', views.certificate_info),
+    path('certificate/<int:pk>/generate-all/', views.generate_all_certificates),
     path('certificate/<int:pk>/generate/<str:roll_no>/', views.generate_certificate),
     path('certificate/<int:pk>/generate/<str:roll_no>/<str:mode>/', views.generate_certificate),
     path('certificate/<int:pk>/csv/<str:user>/', views.download_csv),
+    path('certificate/<int:pk>/jobs/', views.submit_render_job),
+    path('jobs/<int:job_id>/', views.render_job_status),
+    path('jobs/<int:job_id>/result/', views.render_job_result),
+    path('metrics', metrics.metrics),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -6,19 +6,31 @@ from django.db.models import Q
 import csv
 import io
 import json
-from .models import Certificate, CertificateField
-from .serializers import CertificateSerializer, CertificateFieldSerializer
+from .datasets import load_dataset
+from .ingest import CSVValidationError, ingest_csv
+from .jobs import schedule_prerender, submit_job
+from .lookups import details_data, get_certificate, get_fields, info_data, verify_data
+from .metrics import stage
+from .models import Certificate, CertificateField, RenderJob
+from .outputs import is_stored_output, open_output, output_format, output_key, output_url, render_options, save_output
+from .pagination import CertificateCursorPagination
+from .render import claim_render_slot, release_render_slot, render_output, render_rows
+from .rows import get_row, iter_rows, row_columns
+from .serializers import CertificateSerializer, RenderJobSerializer, TemplateSerializer, field_data
+from .snapshots import write_snapshot
+from .storage import open_stream
+from .streaming import ClosingStream, file_response, stream_zip
 import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
-from django.http import HttpResponse
+from django.core.files import File
+from django.db import transaction
+from django.conf import settings
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.text import get_valid_filename
+from django.views.decorators.http import require_GET
 from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
 
-# Add these renderers to your views
-class CustomRenderer(JSONRenderer):
-    def render(self, data, accepted_media_type=None, renderer_context=None):
-        # Customize the rendering if needed
-        return super().render(data, accepted_media_type, renderer_context)
-
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
 def upload_certificate(request):
@@ -38,31 +50,56 @@ def upload_certificate(request):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            certificate = Certificate.objects.create(
-            title=title, 
-                organization=organization,
-            user=user, 
-            template=template, 
-                csv_data=csv_file,
-                roll_column=roll_column
-        )
-
             variables = json.loads(variables)
 
-            for variable in variables:
-                CertificateField.objects.create(
-                    certificate=certificate, 
-                    field_name=variable['field_name'], 
-                    csv_column=variable['csv_column'],
-                    x=variable['x'], 
-                    y=variable['y'], 
-                    font_size=variable['font_size'], 
-                    font_color=variable['font_color'], 
-                    font_family=variable['font_family']
+            with transaction.atomic():
+                # Files are stored last so a rejected sheet leaves nothing behind in storage
+                certificate = Certificate.objects.create(
+                    title=title, 
+                    organization=organization,
+                    user=user, 
+                    roll_column=roll_column
                 )
+
+                CertificateField.objects.bulk_create([
+                    CertificateField(
+                        certificate=certificate, 
+                        field_name=variable['field_name'], 
+                        csv_column=variable['csv_column'],
+                        x=variable['x'], 
+                        y=variable['y'], 
+                        font_size=variable['font_size'], 
+                        font_color=variable['font_color'], 
+                        font_family=variable['font_family'],
+                        align=variable.get('align', 'left'),
+                        max_width=variable.get('max_width')
+                    )
+                    for variable in variables
+                ])
+
+                # Validate the sheet and index it by roll number in one pass
+                columns = [variable['csv_column'] for variable in variables]
+                with stage('csv'):
+                    normalized_csv, row_count = ingest_csv(certificate, csv_file, columns)
+                with normalized_csv:
+                    normalized_csv = File(normalized_csv)
+                    with stage('csv'):
+                        snapshot = write_snapshot(normalized_csv)
+                    with snapshot, stage('storage'):
+                        certificate.template.save(template.name, template, save=False)
+                        certificate.csv_data.save(csv_file.name, normalized_csv, save=False)
+                        certificate.csv_snapshot.save(f'{csv_file.name}.npz', File(snapshot), save=False)
+                certificate.row_count = row_count
+                certificate.save()
+                schedule_prerender(certificate)
             
             return Response({'id': certificate.id}, status=status.HTTP_201_CREATED)
 
+        except CSVValidationError as e:
+            return Response(
+                {'error': 'Invalid CSV file', 'details': e.errors}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             print("Error:", e)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -93,8 +130,10 @@ def delete_certificate(request, pk, user):
 def user_certificate_list(request, user):
     try:
         certificates = Certificate.objects.filter(user=user)
-        serializer = CertificateSerializer(certificates, many=True)
-        return Response(serializer.data)
+        paginator = CertificateCursorPagination()
+        page = paginator.paginate_queryset(certificates, request)
+        serializer = CertificateSerializer(page, many=True, fields=request.query_params.get('fields'))
+        return paginator.get_paginated_response(serializer.data)
     except Exception as e:
         print("Error in user_certificate_list:", str(e))
         return Response(
@@ -108,8 +147,10 @@ def user_certificate_list(request, user):
 def certificate_list(request):
     if request.method == 'GET':
         certificates = Certificate.objects.filter(verified=True)
-        serializer = CertificateSerializer(certificates, many=True)
-        return Response(serializer.data)
+        paginator = CertificateCursorPagination()
+        page = paginator.paginate_queryset(certificates, request)
+        serializer = CertificateSerializer(page, many=True, fields=request.query_params.get('fields'))
+        return paginator.get_paginated_response(serializer.data)
     
 def certificate_detail(request, certificate_id, roll_no):
     if request.method == 'GET':
@@ -130,34 +171,19 @@ def certificate_detail(request, certificate_id, roll_no):
 @api_view(['GET'])
 def certificate_preview(request, pk):
     try:
-        certificate = Certificate.objects.get(id=pk)
-        fields = CertificateField.objects.filter(certificate=certificate)
+        certificate = get_certificate(pk)
+        fields = get_fields(pk)
         
-        # Read first row of CSV
-        df = pd.read_csv(certificate.csv_data)
+        # Read first row of CSV, only the columns the fields use (plus the
+        # roll column, so a certificate without fields still has its rows)
+        df = load_dataset(certificate, row_columns(certificate, fields))
         first_row = df.iloc[0].to_dict()
         
-        # Create fields dictionary with field_name as key
-        fields_serializer = CertificateFieldSerializer(fields, many=True)
         certificate_serializer = CertificateSerializer(certificate)
         
-        # Map field data to their positions and styles
-        field_data = {}
-        for field in fields:
-            # Get the value from CSV using csv_column instead of field_name
-            csv_value = first_row.get(field.csv_column)
-            if csv_value is not None:
-                field_data[field.field_name] = {
-                    'value': str(csv_value),
-                    'x': field.x,
-                    'y': field.y,
-                    'font_size': field.font_size,
-                    'font_color': field.font_color,
-                    'font_family': field.font_family
-                }
         return Response({
             'template': certificate_serializer.data['template'],
-            'fields': field_data
+            'fields': field_data(fields, first_row)
         })
     except Exception as e:
         print("Error in certificate_preview:", str(e))
@@ -171,37 +197,9 @@ def certificate_preview(request, pk):
 def user_templates(request, user):
     if request.method == 'GET':
         try:
-            certificates = Certificate.objects.filter(user=user)
-            templates_data = []
-            
-            for cert in certificates:
-                template_data = {
-                    'id': cert.id,
-                    'title': cert.title,
-                    'template': cert.template.url,
-                    'verified': cert.verified,
-                    'organization': cert.organization,
-                    'created_at': cert.created_at,
-                    'csv_data': cert.csv_data.url,
-                    'fields': []
-                }
-                
-                fields = CertificateField.objects.filter(certificate=cert)
-                for field in fields:
-                    template_data['fields'].append({
-                        'field_name': field.field_name,
-                        'x': field.x,
-                        'y': field.y,
-                        'font_size': field.font_size,
-                        'font_color': field.font_color,
-                        'font_family': field.font_family
-                    })
-                
-                templates_data.append(template_data)
-            
-            # Explicitly set the renderer
-            renderer = CustomRenderer()
-            rendered_content = renderer.render(templates_data)
+            # Fields for every certificate come from one extra query
+            certificates = Certificate.objects.filter(user=user).prefetch_related('fields')
+            templates_data = TemplateSerializer(certificates, many=True).data
             
             return Response(templates_data)
         except Exception as e:
@@ -215,41 +213,16 @@ def user_templates(request, user):
 @api_view(['GET'])
 def certificate_details(request, pk, roll_no):
     try:
-        certificate = Certificate.objects.get(id=pk)
-        fields = CertificateField.objects.filter(certificate=certificate)
+        # Served from the shared cache once any worker has looked it up
+        data = details_data(pk, roll_no)
         
-        # Read CSV and find the row with matching roll number
-        df = pd.read_csv(certificate.csv_data)
-        filtered_df = df[df[certificate.roll_column] == roll_no]
-        
-        if filtered_df.empty:
+        if data is None:
             return Response(
                 {"error": "Roll number not found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
-            
-        row = filtered_df.iloc[0].to_dict()
         
-        # Map field data to their positions and styles
-        field_data = {}
-        for field in fields:
-            csv_value = row.get(field.csv_column)
-            if csv_value is not None:
-                field_data[field.field_name] = {
-                    'value': str(csv_value),
-                    'x': field.x,
-                    'y': field.y,
-                    'font_size': field.font_size,
-                    'font_color': field.font_color,
-                    'font_family': field.font_family
-                }
-
-        return Response({
-            'template': certificate.template.url,
-            'title': certificate.title,
-            'organization': certificate.organization,
-            'fields': field_data
-        })
+        return Response(data)
     except Certificate.DoesNotExist:
         return Response(
             {"error": "Certificate not found"}, 
@@ -263,14 +236,23 @@ def certificate_details(request, pk, roll_no):
         )
 
 
+# A plain Django view: DRF's request wrapping and content negotiation cost
+# more than the lookup itself
+@require_GET
+def verify_roll(request, pk, roll_no):
+    try:
+        return JsonResponse(verify_data(pk, roll_no))
+    except Certificate.DoesNotExist:
+        return JsonResponse({"error": "Certificate not found"}, status=404)
+    except Exception as e:
+        print("Error in verify_roll:", str(e))
+        return JsonResponse({"error": "Failed to verify roll number"}, status=500)
+
+
 @api_view(['GET'])
 def certificate_info(request, pk):
     try:
-        certificate = Certificate.objects.get(id=pk)
-        return Response({
-            'title': certificate.title,
-            'organization': certificate.organization
-        })
+        return Response(info_data(pk))
     except Certificate.DoesNotExist:
         return Response(
             {"error": "Certificate not found"}, 
@@ -282,80 +264,57 @@ def certificate_info(request, pk):
 @renderer_classes([JSONRenderer, BrowsableAPIRenderer])
 def generate_certificate(request, pk, roll_no, mode='preview'):
     try:
-        certificate = Certificate.objects.get(id=pk)
-        fields = CertificateField.objects.filter(certificate=certificate)
+        options = render_options(mode, request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        certificate = get_certificate(pk)
+        fields = get_fields(pk)
         
-        # Read CSV and find the row with matching roll number
-        df = pd.read_csv(certificate.csv_data)
-        filtered_df = df[df[certificate.roll_column] == roll_no]
+        # Look up the row with matching roll number in the index
+        row = get_row(certificate, roll_no)
         
-        if filtered_df.empty:
+        if row is None:
             return Response(
                 {"error": "Roll number not found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
-            
-        row = filtered_df.iloc[0].to_dict()
         
-        # Open the template image
-        with certificate.template.open('rb') as template_file:
-            img = Image.open(template_file)
-            draw = ImageDraw.Draw(img)
-            
-            # Get image dimensions
-            img_width, img_height = img.size
-            
-            # Add text for each field
-            for field in fields:
-                try:
-                    csv_value = str(row.get(field.csv_column, ''))
-                    
-                    # Create font with specified size
-                    try:
-                        # Try to use TrueType font with specified size
-                        font = ImageFont.truetype(
-                            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-                            size=field.font_size
-                        )
-                    except:
-                        # If TrueType fails, create basic font with size
-                        font = ImageFont.load_default()
-                        # Scale up the default font
-                        font_size = field.font_size
-                        if font_size > 20:  # Default font is small, scale it up
-                            font = ImageFont.truetype(
-                                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-                                size=font_size
-                            )
-                    
-                    # Simple positioning - use the coordinates directly
-                    x = field.x
-                    y = field.y
-                    
-                    # Draw text
-                    draw.text(
-                        (x, y),
-                        csv_value,
-                        font=font,
-                        fill=field.font_color or 'black',
-                    )
-                    
-                    print(f"Added text: {csv_value} at position ({x}, {y}) with size {field.font_size}")
-                    
-                except Exception as e:
-                    print(f"Error adding text for field {field.field_name}: {str(e)}")
-                    continue
-            
-            # Save the image
-            img_byte_array = io.BytesIO()
-            img.save(img_byte_array, format='PNG')
-            img_byte_array.seek(0)
-            
-            # Return the response
-            response = HttpResponse(img_byte_array.getvalue(), content_type='image/png')
-            response['Content-Disposition'] = f'inline; filename="certificate_{pk}_{roll_no}.png"'
-            return response
+        # Serve a previously rendered copy when nothing about it has changed
+        key = output_key(certificate, fields, row, options)
+        etag = quote_etag(key)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        extension, content_type = output_format(options)
+        stored = is_stored_output(options)
+        # Send the client straight to a stored copy (pre-rendered, for example) when enabled
+        if settings.DOWNLOAD_REDIRECT and stored:
+            url = output_url(certificate.id, key, extension)
+            if url is not None:
+                return HttpResponseRedirect(url)
+
+        output = open_output(certificate.id, key, extension) if stored else None
+        if output is None:
+            content = render_output(certificate, fields, row, options)
+            if stored:
+                save_output(certificate.id, key, extension, content)
+            output = io.BytesIO(content), len(content)
+
+        # Stream the file rather than copying it into the response
+        output_file, size = output
+        response = file_response(request, output_file, size, content_type, f'certificate_{pk}_{roll_no}.{extension}')
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
             
+    except Certificate.DoesNotExist:
+        return Response(
+            {"error": "Certificate not found"}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
     except Exception as e:
         print(f"Certificate generation error: {str(e)}")
         return Response(
@@ -364,16 +323,110 @@ def generate_certificate(request, pk, roll_no, mode='preview'):
         )
 
 
+@api_view(['GET'])
+def generate_all_certificates(request, pk):
+    try:
+        certificate = Certificate.objects.get(id=pk)
+        fields = list(CertificateField.objects.filter(certificate=certificate))
+    except Certificate.DoesNotExist:
+        return Response(
+            {"error": "Certificate not found"}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    # Each archive keeps a render pool busy for as long as it streams
+    slot = claim_render_slot()
+    if slot is None:
+        response = Response(
+            {"error": "Too many archives are being generated, try again shortly or queue a zip job"}, 
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        response['Retry-After'] = '30'
+        return response
+
+    def entries():
+        rows = iter_rows(certificate, row_columns(certificate, fields))
+        for row, content in render_rows(certificate, fields, rows):
+            roll_no = get_valid_filename(row.get(certificate.roll_column) or 'unknown')
+            yield f'certificate_{pk}_{roll_no}.png', content
+
+    # The archive is written while it is being sent, one certificate at a
+    # time; the slot is given back when the response is closed
+    archive = ClosingStream(stream_zip(entries()), lambda: release_render_slot(slot))
+    response = StreamingHttpResponse(archive, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{get_valid_filename(certificate.title)}-certificates.zip"'
+    return response
+
+
+@api_view(['POST'])
+def submit_render_job(request, pk):
+    try:
+        certificate = Certificate.objects.get(id=pk)
+    except Certificate.DoesNotExist:
+        return Response(
+            {"error": "Certificate not found"}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    kind = request.data.get('kind', 'zip')
+    if kind not in dict(RenderJob.KIND_CHOICES):
+        return Response(
+            {"error": f"Unknown job kind '{kind}'"}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    job = submit_job(certificate, kind)
+    return Response(RenderJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def render_job_status(request, job_id):
+    try:
+        job = RenderJob.objects.get(id=job_id)
+        return Response(RenderJobSerializer(job).data)
+    except RenderJob.DoesNotExist:
+        return Response(
+            {"error": "Job not found"}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+
+@api_view(['GET'])
+def render_job_result(request, job_id):
+    try:
+        job = RenderJob.objects.get(id=job_id)
+    except RenderJob.DoesNotExist:
+        return Response(
+            {"error": "Job not found"}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if job.status != 'done' or not job.result:
+        return Response(
+            {"error": "Job has no result yet", "status": job.status}, 
+            status=status.HTTP_409_CONFLICT
+        )
+
+    if settings.DOWNLOAD_REDIRECT:
+        return HttpResponseRedirect(job.result.url)
+    return file_response(request, open_stream(job.result.storage, job.result.name), job.result.size, 'application/octet-stream',
+                         job.result.name.rsplit('/', 1)[-1], as_attachment=True)
+
+
 @api_view(['GET'])
 def download_csv(request, pk, user):
     try:
         certificate = Certificate.objects.get(id=pk, user=user)
         
-        # Open the CSV file
-        with open(certificate.csv_data.path, 'rb') as csv_file:
-            response = HttpResponse(csv_file.read(), content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="{certificate.title.lower().replace(" ", "-")}-data.csv"'
-            return response
+        # Let the client fetch the object from storage itself when enabled
+        if settings.DOWNLOAD_REDIRECT:
+            return HttpResponseRedirect(certificate.csv_data.url)
+
+        # Otherwise stream the CSV file in chunks
+        filename = f'{certificate.title.lower().replace(" ", "-")}-data.csv'
+        csv_data = certificate.csv_data
+        return file_response(request, open_stream(csv_data.storage, csv_data.name), csv_data.size, 'text/csv',
+                             filename, as_attachment=True)
             
     except Certificate.DoesNotExist:
         return Response(
@@ -0,0 +1,23 @@
+# gunicorn picks this file up automatically from the working directory
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Long enough for a streamed /generate-all/ archive; the default 30s kills
+# the worker part way through one
+timeout = int(os.getenv('REQUEST_TIMEOUT') or 300)
+
+
+def post_worker_init(worker):
+    # Fill the renderer caches before the worker takes its first request
+    from config.render import warm_up
+    warm_up()
+
+
+def child_exit(server, worker):
+    # Drop a dead worker's live metrics when /metrics aggregates across workers
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)